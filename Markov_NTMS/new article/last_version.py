@@ -1,6 +1,15 @@
 import random
 import matplotlib.pyplot as plt
 import numpy as np
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+# Ajouter la racine du dépôt pour importer `src.*`
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from src import packet_rate
 
 # Générer des données normales
 def generate_normal_data(filename, duration=200):
@@ -25,11 +34,13 @@ def simulate_ddos_attack(filename, duration=200):
                 f.write(f"$GPGSA,A,3,01,02,03,04,05,06,07,08,09,10,11,12,1.0,1.0,1.0*30\n")
                 f.write(f"$GPRMC,{millisecond:03d}{random.randint(0, 999):03d}.665,A,4918.{random.randint(100, 999)},N,00014.{random.randint(100, 999)},W,3711.9,355.5,070824,000.0,W*5C\n")
 
-# Lire les données NMEA 2000 depuis un fichier
-def read_nmea2000_data(filename):
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-    return [line.strip() for line in lines]
+# Compter les paquets par milliseconde
+def count_packets(filename, duration=200):
+    # Une seule passe sur le fichier ; le champ horaire des captures
+    # synthétiques encode la milliseconde ($GPGGA,MMMuuu.665)
+    rates = packet_rate.sentence_rates(filename, width=1, unit="ms", duration=duration,
+                                       clock="counter", drop_invalid=False)
+    return rates.counts
 
 # Définir les états
 states = ["Normal", "Anomaly Detected", "Mitigation in Progress", "Blocking"]
@@ -81,18 +92,12 @@ def main():
 
     for i, filename in enumerate(filenames):
         print(f"Analyzing file: {filename}")
-        data = read_nmea2000_data(filename)
-        packet_counts = []
-        for j in range(200):  # Assumer 200 ms de données
-            packet_counts.append(sum(1 for line in data if line.startswith(f"$GPGGA,{j:03d}") or line.startswith(f"$GPRMC,{j:03d}")))
+        packet_counts = count_packets(filename)  # Assumer 200 ms de données
 
         plt.plot(range(200), packet_counts, label=labels[i], color=colors[i])
 
     # Détection des attaques avec le modèle de Markov
-    data_ddos = read_nmea2000_data(ddos_file)
-    packet_counts_ddos = []
-    for j in range(200):
-        packet_counts_ddos.append(sum(1 for line in data_ddos if line.startswith(f"$GPGGA,{j:03d}") or line.startswith(f"$GPRMC,{j:03d}")))
+    packet_counts_ddos = count_packets(ddos_file)
 
     state_history = detect_ddos(packet_counts_ddos)
     state_history_normalized = [i * max(packet_counts_ddos) / max(state_indices.values()) for i in state_history]
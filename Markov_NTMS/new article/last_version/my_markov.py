@@ -1,12 +1,23 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.metrics import confusion_matrix
+import sys
+from pathlib import Path
 
-# Function to read NMEA2000 data
-def read_nmea2000_data(filename):
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-    return [line.strip() for line in lines]
+ROOT = Path(__file__).resolve().parents[3]
+# Add repo root so we can import `src.*`
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from src import packet_rate
+
+# Function to count packets per millisecond
+def count_packets(filename, duration=200):
+    # Single pass over the capture; the time field of the synthetic
+    # captures encodes the millisecond bucket ($GPGGA,MMMuuu.665)
+    rates = packet_rate.sentence_rates(filename, width=1, unit="ms", duration=duration,
+                                       clock="counter", drop_invalid=False)
+    return rates.counts
 
 # Function to calculate the transition matrix
 def calculate_transition_matrix(state_history, num_states):
@@ -87,18 +98,13 @@ def main():
     ddos_file = "nmea2000_ddos.txt"
 
     # Analyze normal data file
-    normal_data = read_nmea2000_data(normal_file)
-    normal_packet_counts = []
-    for j in range(200):
-        normal_packet_counts.append(sum(1 for line in normal_data if line.startswith(f"$GPGGA,{j:03d}") or line.startswith(f"$GPRMC,{j:03d}")))
+    normal_packet_counts = count_packets(normal_file)
 
     # Analyze DDoS data file
-    ddos_data = read_nmea2000_data(ddos_file)
-    ddos_packet_counts = []
+    ddos_packet_counts = count_packets(ddos_file)
     packet_types = []
     interval_timings = []
     for j in range(200):
-        ddos_packet_counts.append(sum(1 for line in ddos_data if line.startswith(f"$GPGGA,{j:03d}") or line.startswith(f"$GPRMC,{j:03d}")))
         packet_types.append('normal' if j % 10 != 0 else 'suspicious')  # Simple example
         interval_timings.append(j % 50)  # Simple example
 
@@ -1,11 +1,22 @@
 import numpy as np
 import matplotlib.pyplot as plt
+import sys
+from pathlib import Path
 
-# Lire les données NMEA 2000 depuis un fichier
-def read_nmea2000_data(filename):
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-    return [line.strip() for line in lines]
+ROOT = Path(__file__).resolve().parents[2]
+# Ajouter la racine du dépôt pour importer `src.*`
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from src import packet_rate
+
+# Compter les paquets par milliseconde
+def count_packets(filename, duration=200):
+    # Une seule passe sur le fichier ; le champ horaire des captures
+    # synthétiques encode la milliseconde ($GPGGA,MMMuuu.665)
+    rates = packet_rate.sentence_rates(filename, width=1, unit="ms", duration=duration,
+                                       clock="counter", drop_invalid=False)
+    return rates.counts
 
 # Définir les états
 states = ["Normal", "Anomaly Detected", "Mitigation in Progress", "Blocking"]
@@ -55,21 +66,14 @@ def main():
     colors = ['blue', 'orange', 'green']
 
     # Lire les données normales
-    normal_data = read_nmea2000_data(normal_file)
-    normal_packet_counts = []
-    for j in range(200):
-        normal_packet_counts.append(sum(1 for line in normal_data if f"{j:03d}" in line.split(",")[1]))
+    normal_packet_counts = count_packets(normal_file)
 
     plt.figure(figsize=(14, 7))
 
     for i, filename in enumerate(attack_files):
         print(f"Analyzing file: {filename}")
-        attack_data = read_nmea2000_data(filename)
-        attack_packet_counts = []
-
         # Compter le nombre de paquets pour chaque milliseconde
-        for j in range(200):
-            attack_packet_counts.append(sum(1 for line in attack_data if f"{j:03d}" in line.split(",")[1]))
+        attack_packet_counts = count_packets(filename)
 
         state_history = detect_ddos_advanced(attack_packet_counts, normal_packet_counts)
         state_indices_history = [state_indices[state] for state in state_history]
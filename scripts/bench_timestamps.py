@@ -0,0 +1,82 @@
+"""Benchmark the cached ISO-8601 decoder used by ``parser.parse_line``."""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from src import parser, simulate
+
+
+def _legacy_timestamp(text: str) -> float:
+    return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+
+
+def legacy_parse_line(line: str) -> parser.Message:
+    """``parse_line`` as it was before the cached timestamp decoder."""
+    ts_str, pgn_str, data_str = line.strip().split(",", 2)
+    ts = _legacy_timestamp(ts_str)
+    fields = {}
+    for item in data_str.split(";"):
+        if item:
+            key, value = item.split("=")
+            fields[key] = float(value)
+    return parser.Message(timestamp=ts, pgn=int(pgn_str), fields=fields)
+
+
+def _time(func: Callable[[str], object], items: List[str], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best / len(items)
+
+
+def _lines(jitter: bool) -> List[str]:
+    rng = random.Random(0)
+    lines: List[str] = []
+    for step in simulate.generate_normal(25000):
+        for msg in step.messages.values():
+            ts = msg.timestamp + (rng.random() if jitter else 0.0)
+            stamp = datetime.fromtimestamp(ts).isoformat(timespec="milliseconds")
+            data = ";".join(f"{k}={v}" for k, v in msg.fields.items())
+            lines.append(f"{stamp},{msg.pgn},{data}")
+    if jitter:
+        lines.sort()
+    return lines
+
+
+def main() -> None:
+    cases = [
+        ("shared step timestamps", _lines(jitter=False)),
+        ("per-message ms timestamps", _lines(jitter=True)),
+    ]
+    for name, lines in cases:
+        stamps = [line.split(",", 1)[0] for line in lines]
+        decoder = parser.TimestampDecoder().decode
+        assert all(
+            decoder(s) == _legacy_timestamp(s) for s in stamps
+        ), "decoder disagrees with datetime.fromisoformat"
+
+        old_ts = _time(_legacy_timestamp, stamps)
+        new_ts = _time(parser.TimestampDecoder().decode, stamps)
+        old_line = _time(legacy_parse_line, lines)
+        new_line = _time(parser.parse_line, lines)
+
+        print(f"{name}: {len(lines)} lines")
+        print(f"  timestamp:  {old_ts * 1e9:6.0f} ns -> {new_ts * 1e9:6.0f} ns  ({old_ts / new_ts:.2f}x)")
+        print(f"  parse_line: {old_line * 1e9:6.0f} ns -> {new_line * 1e9:6.0f} ns  ({old_line / new_line:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+"""Compact binary container for recorded NMEA 2000 traffic.
+
+Re-parsing the ``timestamp,pgn,key=value`` text format dominates training
+time on long recordings.  This module stores the same information as
+fixed-width little-endian records that can be memory-mapped directly:
+
+    header       32 bytes, see ``_HEADER``
+    vocabulary   field names, each as a uint16 length plus UTF-8 bytes
+    records      ``n_records`` rows of (float64 timestamp, int32 PGN,
+                 4 padding bytes, one float64 per field; NaN if missing)
+    time index   float64 timestamp of every ``index_stride``-th record
+
+The sparse time index lets :meth:`BinaryLogReader.read` jump to a time range
+while touching only the pages that hold it.  Records are expected in
+timestamp order; if they are not, the header records this and range queries
+fall back to a full scan.
+"""
+
+from array import array
+from itertools import islice
+import struct
+from typing import Iterable, Iterator, List, Sequence
+
+import numpy as np
+
+from .parser import Message, MessageBatch, iter_messages, open_log
+
+MAGIC = b"N2KB"
+VERSION = 1
+_FLAG_SORTED = 1
+# magic, version, flags, n_records, index_offset, n_fields, index_stride
+_HEADER = struct.Struct("<4sHHQQII")
+_BLOCK = 65536
+
+
+def _record_dtype(field_names: Sequence[str]) -> np.dtype:
+    return np.dtype(
+        [("timestamp", "<f8"), ("pgn", "<i4"), ("_pad", "<i4")]
+        + [(f"f{i}", "<f8") for i in range(len(field_names))]
+    )
+
+
+class BinaryLogWriter:
+    """Stream messages into a binary log with a fixed field vocabulary.
+
+    Use as a context manager or call :meth:`close` to write the time index
+    and finalise the header.
+    """
+
+    def __init__(
+        self, path: str, field_names: Sequence[str], index_stride: int = 1024
+    ):
+        self.field_names: List[str] = list(field_names)
+        self.index_stride = index_stride
+        self._dtype = _record_dtype(self.field_names)
+        self._fh = open(path, "wb")
+        self._fh.write(b"\0" * _HEADER.size)
+        for name in self.field_names:
+            encoded = name.encode()
+            self._fh.write(struct.pack("<H", len(encoded)) + encoded)
+        self._fh.write(b"\0" * (-self._fh.tell() % 8))
+        self._index = array("d")
+        self.n_records = 0
+        self._last_ts = float("-inf")
+        self._sorted = True
+
+    def write_batch(self, batch: MessageBatch) -> None:
+        """Append every row of ``batch``."""
+        unknown = set(batch.columns) - set(self.field_names)
+        if unknown:
+            raise ValueError(f"fields not in vocabulary: {sorted(unknown)}")
+        n = len(batch)
+        if n == 0:
+            return
+        records = np.zeros(n, dtype=self._dtype)
+        records["timestamp"] = batch.timestamps
+        records["pgn"] = batch.pgns
+        for i, name in enumerate(self.field_names):
+            col = batch.columns.get(name)
+            records[f"f{i}"] = np.nan if col is None else col
+        ts = batch.timestamps
+        if self._sorted and (ts[0] < self._last_ts or np.any(ts[1:] < ts[:-1])):
+            self._sorted = False
+        self._last_ts = float(ts[-1])
+        first = -self.n_records % self.index_stride
+        self._index.extend(ts[first :: self.index_stride].tolist())
+        self._fh.write(records.tobytes())
+        self.n_records += n
+
+    def write(self, messages: Iterable[Message]) -> None:
+        """Append ``messages``, converting them in fixed-size blocks."""
+        it = iter(messages)
+        while True:
+            batch = MessageBatch.from_messages(islice(it, _BLOCK))
+            if not len(batch):
+                break
+            self.write_batch(batch)
+
+    def close(self) -> None:
+        if self._fh.closed:
+            return
+        index_offset = self._fh.tell()
+        self._index.tofile(self._fh)
+        self._fh.seek(0)
+        self._fh.write(
+            _HEADER.pack(
+                MAGIC,
+                VERSION,
+                _FLAG_SORTED if self._sorted else 0,
+                self.n_records,
+                index_offset,
+                len(self.field_names),
+                self.index_stride,
+            )
+        )
+        self._fh.close()
+
+    def __enter__(self) -> "BinaryLogWriter":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class BinaryLogReader:
+    """Memory-mapped reader for files written by :class:`BinaryLogWriter`."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            header = fh.read(_HEADER.size)
+            if len(header) < _HEADER.size or header[:4] != MAGIC:
+                raise ValueError(f"{path} is not a binary NMEA 2000 log")
+            (
+                _,
+                version,
+                flags,
+                n_records,
+                index_offset,
+                n_fields,
+                self.index_stride,
+            ) = _HEADER.unpack(header)
+            if version != VERSION:
+                raise ValueError(f"unsupported binary log version {version}")
+            names: List[str] = []
+            for _ in range(n_fields):
+                (length,) = struct.unpack("<H", fh.read(2))
+                names.append(fh.read(length).decode())
+            data_offset = fh.tell() + (-fh.tell() % 8)
+        self.field_names = names
+        self.sorted = bool(flags & _FLAG_SORTED)
+        dtype = _record_dtype(names)
+        self._records = (
+            np.memmap(path, dtype=dtype, mode="r", offset=data_offset, shape=(n_records,))
+            if n_records
+            else np.zeros(0, dtype=dtype)
+        )
+        n_index = -(-n_records // self.index_stride)
+        self._index = (
+            np.memmap(path, dtype="<f8", mode="r", offset=index_offset, shape=(n_index,))
+            if n_index
+            else np.zeros(0)
+        )
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _locate(self, t: float) -> int:
+        """Index of the first record with ``timestamp >= t``."""
+        block = max(int(np.searchsorted(self._index, t, side="left")) - 1, 0)
+        lo = block * self.index_stride
+        hi = min(lo + self.index_stride + 1, len(self._records))
+        ts = self._records["timestamp"][lo:hi]
+        return lo + int(np.searchsorted(ts, t, side="left"))
+
+    def _range(self, start: float | None, end: float | None) -> tuple[int, int]:
+        lo = 0 if start is None else self._locate(start)
+        hi = len(self._records) if end is None else self._locate(end)
+        return lo, max(lo, hi)
+
+    def _to_batch(self, records: np.ndarray) -> MessageBatch:
+        return MessageBatch(
+            timestamps=np.array(records["timestamp"], dtype=np.float64),
+            pgns=np.array(records["pgn"], dtype=np.int32),
+            columns={
+                name: np.array(records[f"f{i}"], dtype=np.float64)
+                for i, name in enumerate(self.field_names)
+            },
+        )
+
+    def read(self, start: float | None = None, end: float | None = None) -> MessageBatch:
+        """Return messages with ``start <= timestamp < end`` as a batch."""
+        if self.sorted:
+            lo, hi = self._range(start, end)
+            return self._to_batch(self._records[lo:hi])
+        ts = self._records["timestamp"]
+        mask = np.ones(len(ts), dtype=bool)
+        if start is not None:
+            mask &= ts >= start
+        if end is not None:
+            mask &= ts < end
+        return self._to_batch(self._records[mask])
+
+    def iter_batches(
+        self, start: float | None = None, end: float | None = None, size: int = _BLOCK
+    ) -> Iterator[MessageBatch]:
+        """Yield the requested time range as consecutive batches of ``size`` rows."""
+        if not self.sorted:
+            batch = self.read(start, end)
+            for lo in range(0, len(batch), size):
+                yield batch[lo : lo + size]
+            return
+        lo, hi = self._range(start, end)
+        for pos in range(lo, hi, size):
+            yield self._to_batch(self._records[pos : min(pos + size, hi)])
+
+    def iter_messages(
+        self, start: float | None = None, end: float | None = None
+    ) -> Iterator[Message]:
+        """Lazily yield messages in the requested time range."""
+        for batch in self.iter_batches(start, end):
+            yield from batch
+
+
+def write_messages(
+    path: str,
+    messages: Iterable[Message],
+    field_names: Sequence[str] | None = None,
+    index_stride: int = 1024,
+) -> None:
+    """Write ``messages`` to a binary log.
+
+    Without ``field_names`` the messages are materialised once to collect
+    the vocabulary.
+    """
+
+    if field_names is None:
+        batch = MessageBatch.from_messages(messages)
+        with BinaryLogWriter(path, batch.field_names, index_stride) as writer:
+            writer.write_batch(batch)
+        return
+    with BinaryLogWriter(path, field_names, index_stride) as writer:
+        writer.write(messages)
+
+
+def _scan_field_names(path: str) -> List[str]:
+    names: dict[str, None] = {}
+    with open_log(path) as fh:
+        for line in fh:
+            if not line.strip() or line.startswith("#"):
+                continue
+            data = line.rstrip("\n").split(",", 2)[-1]
+            for item in data.split(";"):
+                if item:
+                    names.setdefault(item.split("=", 1)[0], None)
+    return list(names)
+
+
+def convert_text_log(
+    src: str,
+    dst: str,
+    field_names: Sequence[str] | None = None,
+    index_stride: int = 1024,
+) -> int:
+    """Convert a text log at ``src`` to a binary log at ``dst``.
+
+    The conversion streams with bounded memory.  When ``field_names`` is not
+    given, a quick first pass over ``src`` collects the vocabulary.  Returns
+    the number of records written.
+    """
+
+    if field_names is None:
+        field_names = _scan_field_names(src)
+    with BinaryLogWriter(dst, field_names, index_stride) as writer:
+        writer.write(iter_messages(src))
+        return writer.n_records
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+"""Learning feature bins from data with a streaming quantile sketch.
+
+The hard-coded edges in :mod:`features` suit the simulated boat only.
+:class:`BinLearner` makes a single pass over training messages and keeps one
+:class:`QuantileSketch` per PGN/field, so memory is bounded regardless of the
+amount of data.  Learners built over separate shards can be merged, and the
+resulting tables are installed with :func:`features.set_bins`.
+"""
+
+import math
+import random
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from . import features
+from .parser import Message, MessageBatch
+
+
+class QuantileSketch:
+    """Mergeable KLL-style quantile sketch.
+
+    Items live in a hierarchy of compactors; an item at level ``h`` stands
+    for ``2**h`` observations.  A full level is sorted and every other item,
+    starting at a random offset, is promoted to the next level.  Level
+    capacities shrink geometrically towards the bottom, so the sketch keeps
+    ``O(k log(n / k))`` items and rank errors are roughly ``1 / k``.
+
+    Parameters
+    ----------
+    k:
+        Capacity of the top compactor; larger is more accurate.
+    seed:
+        Seed for the compaction coin flips.
+    """
+
+    _C = 2.0 / 3.0
+
+    def __init__(self, k: int = 200, seed: int | str | None = None):
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.n = 0
+        self._levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - level - 1
+        return max(2, int(math.ceil(self.k * self._C**depth)))
+
+    def update(self, values: float | Sequence[float] | np.ndarray) -> None:
+        """Add one value or an array of values; NaNs are ignored."""
+        arr = np.asarray(values, dtype=np.float64).reshape(-1)
+        arr = arr[~np.isnan(arr)]
+        if not len(arr):
+            return
+        self.n += len(arr)
+        self._levels[0] = np.concatenate((self._levels[0], arr))
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Fold ``other`` into this sketch and return ``self``."""
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for h, items in enumerate(other._levels):
+            self._levels[h] = np.concatenate((self._levels[h], items))
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self._levels):
+            items = self._levels[h]
+            if len(items) >= self._capacity(h):
+                if h + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind so weights are preserved
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[: len(items) - len(keep)]
+                promoted = pairs[self._rng.randint(0, 1) :: 2]
+                self._levels[h] = keep
+                self._levels[h + 1] = np.concatenate((self._levels[h + 1], promoted))
+            h += 1
+
+    def _weighted(self) -> Tuple[np.ndarray, np.ndarray]:
+        values = np.concatenate(self._levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2.0**h) for h, items in enumerate(self._levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs: Sequence[float] | np.ndarray) -> np.ndarray:
+        """Approximate values at quantile ranks ``qs`` (each in ``[0, 1]``)."""
+        if not self.n:
+            raise ValueError("empty sketch")
+        values, cum = self._weighted()
+        ranks = np.asarray(qs, dtype=np.float64) * cum[-1]
+        idx = np.searchsorted(cum, ranks, side="left")
+        return values[np.minimum(idx, len(values) - 1)]
+
+    def quantile(self, q: float) -> float:
+        """Approximate value at quantile rank ``q``."""
+        return float(self.quantiles([q])[0])
+
+    @property
+    def size(self) -> int:
+        """Number of items currently retained."""
+        return sum(len(items) for items in self._levels)
+
+
+def _edge_label(lo: float, hi: float) -> str:
+    return f"{lo:.4g}_{hi:.4g}"
+
+
+class BinLearner:
+    """Learn per-PGN/field quantile bins in one streaming pass.
+
+    Parameters
+    ----------
+    n_bins:
+        Number of bins per field.  Heavily tied data may yield fewer.
+    fields:
+        ``{pgn: [field, ...]}`` to learn.  Defaults to the fields of the
+        currently installed tables, so the state layout stays the same.
+    k:
+        Accuracy parameter of each :class:`QuantileSketch`.
+    """
+
+    def __init__(
+        self,
+        n_bins: int = 4,
+        fields: Mapping[int, Sequence[str]] | None = None,
+        k: int = 200,
+        seed: int | None = None,
+    ):
+        if n_bins < 1:
+            raise ValueError("n_bins must be positive")
+        if fields is None:
+            fields = {
+                pgn: [table.key for table in tables]
+                for pgn, tables in features.bin_tables().items()
+            }
+        self.n_bins = n_bins
+        self.fields: Dict[int, List[str]] = {pgn: list(keys) for pgn, keys in fields.items()}
+        self.k = k
+        self._seed = seed
+        self.sketches: Dict[Tuple[int, str], QuantileSketch] = {}
+
+    def _sketch(self, pgn: int, key: str) -> QuantileSketch:
+        sketch = self.sketches.get((pgn, key))
+        if sketch is None:
+            seed = None if self._seed is None else f"{self._seed}:{pgn}:{key}"
+            sketch = self.sketches[(pgn, key)] = QuantileSketch(self.k, seed)
+        return sketch
+
+    def update(self, messages: Iterable[Message] | MessageBatch) -> "BinLearner":
+        """Feed training ``messages`` (or a whole batch) and return ``self``."""
+        if isinstance(messages, MessageBatch):
+            return self.update_batch(messages)
+        pending: Dict[Tuple[int, str], List[float]] = {}
+        for msg in messages:
+            for key in self.fields.get(msg.pgn, ()):
+                value = msg.fields.get(key)
+                if value is not None:
+                    buf = pending.setdefault((msg.pgn, key), [])
+                    buf.append(value)
+                    if len(buf) >= self.k * 8:
+                        self._sketch(msg.pgn, key).update(buf)
+                        buf.clear()
+        for (pgn, key), buf in pending.items():
+            self._sketch(pgn, key).update(buf)
+        return self
+
+    def update_batch(self, batch: MessageBatch) -> "BinLearner":
+        """Column-wise :meth:`update` for a :class:`MessageBatch`."""
+        for pgn, keys in self.fields.items():
+            rows = batch.pgns == pgn
+            if not rows.any():
+                continue
+            for key in keys:
+                col = batch.columns.get(key)
+                if col is not None:
+                    self._sketch(pgn, key).update(col[rows])
+        return self
+
+    def merge(self, other: "BinLearner") -> "BinLearner":
+        """Fold in a learner trained on another shard and return ``self``."""
+        for pgn, keys in other.fields.items():
+            mine = self.fields.setdefault(pgn, [])
+            mine.extend(k for k in keys if k not in mine)
+        for key, sketch in other.sketches.items():
+            if key in self.sketches:
+                self.sketches[key].merge(sketch)
+            else:
+                self._sketch(*key).merge(sketch)
+        return self
+
+    def edges(self) -> Dict[int, Dict[str, List[float]]]:
+        """Learned ``_BINS``-style edges for every field with data.
+
+        The outer edges are infinite, so every value falls into a bin.
+        """
+        qs = np.arange(1, self.n_bins) / self.n_bins
+        out: Dict[int, Dict[str, List[float]]] = {}
+        for pgn, keys in self.fields.items():
+            for key in keys:
+                sketch = self.sketches.get((pgn, key))
+                if sketch is None or not sketch.n:
+                    continue
+                cuts = np.unique(sketch.quantiles(qs)).tolist() if len(qs) else []
+                out.setdefault(pgn, {})[key] = [-math.inf, *cuts, math.inf]
+        return out
+
+    def tables(self) -> features.BinTables:
+        """Compiled tables ready for :func:`features.set_bins`."""
+        edges = self.edges()
+        labels = {
+            pgn: {
+                key: [_edge_label(lo, hi) for lo, hi in zip(bins, bins[1:])]
+                for key, bins in fields.items()
+            }
+            for pgn, fields in edges.items()
+        }
+        return features.compile_bins(edges, labels)
+
+
+def learn_bins(
+    messages: Iterable[Message] | MessageBatch,
+    n_bins: int = 4,
+    fields: Mapping[int, Sequence[str]] | None = None,
+) -> features.BinTables:
+    """Learn quantile bin tables from ``messages`` in a single pass."""
+
+    return BinLearner(n_bins, fields).update(messages).tables()
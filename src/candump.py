@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+"""Decoder for raw NMEA 2000 CAN frames recorded by ``candump``.
+
+Both the ``candump -l`` log format::
+
+    (1704067200.123456) can0 09F11201#FF0100FF7FFF7FFD
+
+and the default ASCII format with ``-t a`` / ``-t A`` timestamps::
+
+    (2024-01-01 00:00:00.123456)  can0  09F11201   [8]  FF 01 00 FF 7F FF 7F FD
+
+are accepted.  ASCII lines without a timestamp need an explicit ``clock``
+(e.g. :func:`time.time` for a live capture) and are otherwise counted as
+malformed, so replaying a log is deterministic.
+
+The 29-bit CAN identifier is split into priority, PGN and source address,
+multi-frame fast-packets are reassembled per source/PGN and the PGNs used
+in :mod:`features` are decoded into :class:`Message` objects with the same
+field names and units as the simulated traffic (degrees for angles, knots
+for speeds, revolutions per minute for engine speed).  Engine parameters
+are kept for one engine instance and wind data for one wind reference, so
+a twin-engine boat or a station sending both true and apparent wind does
+not interleave two streams into one state sequence.
+"""
+
+from dataclasses import dataclass, field
+from functools import partial
+import math
+import os
+import struct
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from . import features
+from .parser import LogSource, Message, MessageBatch, TimestampDecoder, open_log
+
+_RAD_TO_DEG = 180.0 / math.pi
+_MS_TO_KNOTS = 3600.0 / 1852.0
+
+# PGNs transmitted as fast-packets (up to 223 bytes over several frames)
+FAST_PACKET_PGNS = frozenset(
+    {
+        126208, 126464, 126720, 126996, 126998, 127233, 127237, 127489,
+        127496, 127497, 127498, 127503, 127504, 127506, 127507, 127509,
+        128275, 128520, 129029, 129038, 129039, 129040, 129041, 129284,
+        129285, 129540, 129793, 129794, 129795, 129796, 129797, 129798,
+        129801, 129802, 129808, 129809, 129810, 130060, 130061, 130064,
+        130065, 130066, 130067, 130068, 130069, 130070, 130071, 130072,
+        130073, 130074, 130320, 130321, 130322, 130323, 130324, 130567,
+        130577, 130578, 130816,
+    }
+)
+
+_U16 = struct.Struct("<H")
+
+# Wind reference codes of PGN 130306 (low three bits of byte 5)
+WIND_TRUE_NORTH = 0
+WIND_MAGNETIC = 1
+WIND_APPARENT = 2
+WIND_TRUE_BOAT = 3
+WIND_TRUE_WATER = 4
+
+
+def parse_can_id(can_id: int) -> Tuple[int, int, int, int]:
+    """Split a 29-bit identifier into ``(priority, pgn, source, destination)``.
+
+    PDU1 PGNs (PF < 240) are addressed; their destination byte is removed
+    from the PGN.  PDU2 PGNs are broadcast and report destination 255.
+    """
+
+    priority = (can_id >> 26) & 0x7
+    source = can_id & 0xFF
+    pf = (can_id >> 16) & 0xFF
+    if pf < 240:
+        return priority, (can_id >> 8) & 0x3FF00, source, (can_id >> 8) & 0xFF
+    return priority, (can_id >> 8) & 0x3FFFF, source, 0xFF
+
+
+def _u16(data: bytes, offset: int, scale: float) -> float | None:
+    if len(data) < offset + 2:
+        return None
+    (raw,) = _U16.unpack_from(data, offset)
+    # 0xFFFF means "not available", 0xFFFE "out of range"
+    return None if raw >= 0xFFFE else raw * scale
+
+
+def _decode_heading(data: bytes) -> Dict[str, float]:
+    heading = _u16(data, 1, 0.0001 * _RAD_TO_DEG)
+    return {} if heading is None else {"heading": heading}
+
+
+def _decode_speed(data: bytes) -> Dict[str, float]:
+    # Prefer speed through water, fall back to ground referenced speed
+    speed = _u16(data, 1, 0.01 * _MS_TO_KNOTS)
+    if speed is None:
+        speed = _u16(data, 3, 0.01 * _MS_TO_KNOTS)
+    return {} if speed is None else {"speed": speed}
+
+
+def _decode_engine(data: bytes, instance: int = 0) -> Dict[str, float]:
+    # Byte 0 is the engine instance; other engines are a separate stream
+    if not data or data[0] != instance:
+        return {}
+    rpm = _u16(data, 1, 0.25)
+    return {} if rpm is None else {"rpm": rpm}
+
+
+def _decode_wind(data: bytes, reference: int = WIND_APPARENT) -> Dict[str, float]:
+    if len(data) < 6 or data[5] & 0x7 != reference:
+        return {}
+    fields: Dict[str, float] = {}
+    wind_speed = _u16(data, 1, 0.01 * _MS_TO_KNOTS)
+    wind_dir = _u16(data, 3, 0.0001 * _RAD_TO_DEG)
+    if wind_speed is not None:
+        fields["wind_speed"] = wind_speed
+    if wind_dir is not None:
+        fields["wind_dir"] = wind_dir
+    return fields
+
+
+DECODERS: Dict[int, Callable[[bytes], Dict[str, float]]] = {
+    features.PGN_HEADING: _decode_heading,
+    features.PGN_SPEED: _decode_speed,
+    features.PGN_ENGINE: _decode_engine,
+    features.PGN_WIND: _decode_wind,
+}
+
+
+@dataclass
+class _FastPacket:
+    sequence: int
+    length: int
+    next_frame: int
+    data: bytearray = field(default_factory=bytearray)
+
+
+class CandumpDecoder:
+    """Stateful frame decoder with per-source/PGN fast-packet buffers.
+
+    Frames of PGNs without a decoder are skipped as early as possible, so
+    busy buses cost little more than splitting each line.  Counters for
+    skipped and malformed frames are kept for diagnostics.
+
+    ``clock`` timestamps lines that carry none; without it such lines are
+    malformed.  ``engine_instance`` and ``wind_reference`` select the engine
+    and the wind reference (one of the ``WIND_*`` codes) decoded by the
+    default decoders; frames for other engines or references yield nothing.
+    """
+
+    def __init__(
+        self,
+        decoders: Dict[int, Callable[[bytes], Dict[str, float]]] | None = None,
+        fast_packet_pgns: Iterable[int] = FAST_PACKET_PGNS,
+        clock: Callable[[], float] | None = None,
+        engine_instance: int = 0,
+        wind_reference: int = WIND_APPARENT,
+    ):
+        if decoders is None:
+            decoders = {
+                **DECODERS,
+                features.PGN_ENGINE: partial(_decode_engine, instance=engine_instance),
+                features.PGN_WIND: partial(_decode_wind, reference=wind_reference),
+            }
+        self.decoders = dict(decoders)
+        self.fast_packet_pgns = frozenset(fast_packet_pgns)
+        self.frames = 0
+        self.ignored = 0
+        self.malformed = 0
+        self._packets: Dict[Tuple[int, int], _FastPacket] = {}
+        self.clock = clock
+        self._timestamps = TimestampDecoder().decode
+
+    def decode_frame(self, timestamp: float, can_id: int, data: bytes) -> Message | None:
+        """Feed one frame; return a :class:`Message` once a PGN is complete."""
+        self.frames += 1
+        _, pgn, source, _ = parse_can_id(can_id)
+        decoder = self.decoders.get(pgn)
+        if decoder is None:
+            self.ignored += 1
+            return None
+        if pgn in self.fast_packet_pgns:
+            payload = self._reassemble(source, pgn, data)
+            if payload is None:
+                return None
+        else:
+            payload = data
+        fields = decoder(payload)
+        if not fields:
+            return None
+        return Message(timestamp=timestamp, pgn=pgn, fields=fields)
+
+    def _reassemble(self, source: int, pgn: int, data: bytes) -> bytes | None:
+        if not data:
+            self.malformed += 1
+            return None
+        key = (source, pgn)
+        sequence, frame = data[0] >> 5, data[0] & 0x1F
+        if frame == 0:
+            if len(data) < 2:
+                self.malformed += 1
+                return None
+            packet = _FastPacket(sequence, data[1], 1, bytearray(data[2:]))
+            if len(packet.data) >= packet.length:
+                return bytes(packet.data[: packet.length])
+            self._packets[key] = packet
+            return None
+        packet = self._packets.get(key)
+        if packet is None or packet.sequence != sequence or packet.next_frame != frame:
+            # Lost or reordered frame: abandon the partial packet
+            self._packets.pop(key, None)
+            self.malformed += 1
+            return None
+        packet.data += data[1:]
+        packet.next_frame += 1
+        if len(packet.data) >= packet.length:
+            del self._packets[key]
+            return bytes(packet.data[: packet.length])
+        return None
+
+    def decode_line(self, line: str) -> Message | None:
+        """Decode one ``candump`` line in either supported format."""
+        line = line.strip()
+        if not line or line[0] == "#":
+            return None
+        try:
+            if line[0] == "(":
+                close = line.find(")")
+                if close == -1:
+                    raise ValueError("unterminated timestamp")
+                timestamp = self._timestamps(line[1:close])
+                rest = line[close + 1 :].split()
+            elif self.clock is not None:
+                timestamp = self.clock()
+                rest = line.split()
+            else:
+                raise ValueError("missing timestamp")
+            if len(rest) == 2 and "#" in rest[1]:
+                # candump -l: "can0 09F11201#FF0100FF7FFF7FFD"
+                id_str, data_str = rest[1].split("#", 1)
+                data = bytes.fromhex(data_str)
+            else:
+                # ASCII: "can0 09F11201 [8] FF 01 00 ..."
+                id_str = rest[1]
+                data = bytes.fromhex("".join(rest[3:]))
+            if len(id_str) != 8:
+                # 11-bit standard frames and CAN FD are not NMEA 2000 traffic
+                self.ignored += 1
+                return None
+            if not id_str.isalnum():
+                # int() would accept a sign or underscores
+                raise ValueError(f"invalid CAN id {id_str!r}")
+            can_id = int(id_str, 16)
+        except (IndexError, ValueError):
+            self.malformed += 1
+            return None
+        return self.decode_frame(timestamp, can_id, data)
+
+    def iter_messages(self, lines: Iterable[str]) -> Iterator[Message]:
+        """Lazily decode ``lines`` into messages."""
+        decode = self.decode_line
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode()
+            msg = decode(line)
+            if msg is not None:
+                yield msg
+
+
+def iter_messages(source: LogSource) -> Iterator[Message]:
+    """Lazily decode a ``candump`` log path, file object or line iterable."""
+
+    decoder = CandumpDecoder()
+    if isinstance(source, (str, os.PathLike)):
+        with open_log(source) as fh:
+            yield from decoder.iter_messages(fh)
+    else:
+        yield from decoder.iter_messages(source)
+
+
+def load_messages(source: LogSource) -> List[Message]:
+    """Decode a whole ``candump`` log into a list of messages."""
+
+    return list(iter_messages(source))
+
+
+def load_batch(source: LogSource) -> MessageBatch:
+    """Decode a ``candump`` log straight into a :class:`MessageBatch`."""
+
+    return MessageBatch.from_messages(iter_messages(source))
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+"""Continuous-time Markov chain for irregularly timed state streams.
+
+PGNs arrive at different and jittery rates, so "one step" of a discrete
+chain means 100 ms for heading but a second for wind.  A continuous-time
+chain instead learns a generator matrix ``Q``: state ``i`` is left at rate
+``-Q[i, i]`` and jumps to ``j`` at rate ``Q[i, j]``.  The maximum-likelihood
+estimate is ``Q[i, j] = N[i, j] / T[i]``, where ``N`` counts jumps and ``T``
+is the total time spent (holding time) in each state.
+
+The probability of being in ``j`` after ``t`` seconds from ``i`` is
+``expm(Q t)[i, j]``.  The matrix exponential is computed by uniformization
+and kept in an LRU cache keyed by logarithmically bucketed ``t``, so jittery
+gaps of about the same length share one matrix.
+"""
+
+from collections import OrderedDict
+import math
+from typing import Any, Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+
+class ContinuousTimeMarkovChain:
+    """Continuous-time Markov chain estimated from jump counts and holding times.
+
+    Parameters
+    ----------
+    states:
+        Iterable of all possible states, as for :class:`MarkovChain`.
+    alpha:
+        Pseudo-jumps per row, spread evenly over the other states.  This
+        plays the role of Laplace smoothing, so every jump stays possible.
+    prior_time:
+        Pseudo holding time added to every state.  Defaults to the mean
+        observed interval, so an unseen state is left about once per sample.
+    resolution:
+        Relative width of the ``t`` buckets of the transition cache; ``t``
+        is rounded to a power of ``1 + resolution``.
+    """
+
+    EXPM_CACHE = 64
+    REFRESH_EVERY = 256
+    # Uniformization is run on t / 2**m with rate * t below this, then squared
+    _MAX_RATE_TIME = 4.0
+    _TOL = 1e-12
+
+    def __init__(
+        self,
+        states: Iterable[Hashable],
+        alpha: float = 1.0,
+        prior_time: float | None = None,
+        resolution: float = 0.05,
+    ):
+        if alpha <= 0:
+            raise ValueError("alpha must be positive")
+        if resolution <= 0:
+            raise ValueError("resolution must be positive")
+        self.states: List[Hashable] = list(states)
+        self._index: Dict[Hashable, int] = {s: i for i, s in enumerate(self.states)}
+        self.alpha = alpha
+        self.prior_time = prior_time
+        self.resolution = resolution
+        self._log_base = math.log1p(resolution)
+        n = len(self.states)
+        self.jumps = np.zeros((n, n))
+        self.holding = np.zeros(n)
+        # Number of intervals observed, for the default prior time
+        self.n_intervals = 0
+        self._derived: Dict[Any, Any] = {}
+        self._expm: OrderedDict[int, np.ndarray] = OrderedDict()
+        # Deferred observe() calls since the generator was last rebuilt
+        self._deferred = 0
+
+    def _invalidate(self) -> None:
+        self._deferred = 0
+        if self._derived or self._expm:
+            self._derived.clear()
+            self._expm.clear()
+
+    def __contains__(self, state: Hashable) -> bool:
+        return state in self._index
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the counts and cached matrices."""
+        cached = sum(m.nbytes for m in self._expm.values())
+        return self.jumps.nbytes + self.holding.nbytes + cached
+
+    def encode(self, sequence: Iterable[Hashable], strict: bool = True) -> np.ndarray:
+        """Map ``sequence`` to state indices; see :meth:`MarkovChain.encode`."""
+        index = self._index
+        if strict:
+            codes = [index[s] for s in sequence]
+        else:
+            codes = [index.get(s, -1) for s in sequence]
+        return np.asarray(codes, dtype=np.int64)
+
+    def add_states(self, states: Iterable[Hashable]) -> None:
+        """Extend the state space with ``states`` not already present."""
+        new = [s for s in dict.fromkeys(states) if s not in self._index]
+        if not new:
+            return
+        for s in new:
+            self._index[s] = len(self.states)
+            self.states.append(s)
+        n = len(self.states)
+        jumps = np.zeros((n, n))
+        jumps[: len(self.jumps), : len(self.jumps)] = self.jumps
+        self.jumps = jumps
+        self.holding = np.concatenate((self.holding, np.zeros(n - len(self.holding))))
+        self._invalidate()
+
+    # Fitting
+
+    def _add(self, a: np.ndarray, b: np.ndarray, durations: np.ndarray) -> None:
+        keep = durations >= 0
+        a, b, durations = a[keep], b[keep], durations[keep]
+        if not len(a):
+            return
+        self._invalidate()
+        n = len(self.states)
+        self.holding += np.bincount(a, weights=durations, minlength=n)
+        moved = a != b
+        np.add.at(self.jumps, (a[moved], b[moved]), 1.0)
+        self.n_intervals += len(a)
+
+    def fit(self, sequence: Iterable[Hashable], timestamps: Iterable[float]) -> None:
+        """Add the holding times and jumps of a timestamped state sequence.
+
+        The state observed at each timestamp is assumed to hold until the
+        next observation.  Unknown states break the sequence.
+        """
+        codes = self.encode(sequence, strict=False)
+        times = np.asarray(list(timestamps), dtype=np.float64)
+        if len(times) != len(codes):
+            raise ValueError("need one timestamp per state")
+        a, b = codes[:-1], codes[1:]
+        known = (a >= 0) & (b >= 0)
+        self._add(a[known], b[known], np.diff(times)[known])
+
+    def add_transitions(
+        self,
+        pairs: Iterable[Tuple[Hashable, Hashable]],
+        durations: Iterable[float],
+    ) -> None:
+        """Add ``(a, b)`` observations ``durations`` seconds apart.
+
+        Each pair adds its duration to the holding time of ``a`` and, if
+        ``b`` differs from ``a``, one ``a -> b`` jump.  Pairs with unknown
+        states or negative durations are skipped.
+        """
+        index = self._index
+        pairs = list(pairs)
+        a = np.asarray([index.get(p[0], -1) for p in pairs], dtype=np.int64)
+        b = np.asarray([index.get(p[1], -1) for p in pairs], dtype=np.int64)
+        durations = np.asarray(list(durations), dtype=np.float64)
+        known = (a >= 0) & (b >= 0)
+        self._add(a[known], b[known], durations[known])
+
+    def observe(self, a: Hashable, b: Hashable, elapsed: float, defer: bool = False) -> None:
+        """Add a single ``a -> b`` observation ``elapsed`` seconds apart.
+
+        With ``defer`` the generator and the cached matrix exponentials are
+        only rebuilt every ``REFRESH_EVERY`` deferred observations, so online
+        learning costs no matrix exponential per transition.
+        """
+        i, j = self._index[a], self._index[b]
+        if elapsed < 0:
+            return
+        if not defer:
+            self._invalidate()
+        else:
+            self._deferred += 1
+            if self._deferred >= self.REFRESH_EVERY:
+                self._invalidate()
+        self.holding[i] += elapsed
+        if i != j:
+            self.jumps[i, j] += 1.0
+        self.n_intervals += 1
+
+    # Generator and transition probabilities
+
+    def generator(self) -> np.ndarray:
+        """Smoothed generator matrix ``Q`` (``S x S``, rows sum to zero)."""
+        q = self._derived.get("generator")
+        if q is None:
+            n = len(self.states)
+            prior = self.prior_time
+            if prior is None:
+                observed = float(self.holding.sum())
+                prior = observed / self.n_intervals if self.n_intervals and observed else 1.0
+            pseudo = self.alpha / (n - 1) if n > 1 else 0.0
+            q = (self.jumps + pseudo) / (self.holding + prior)[:, None]
+            np.fill_diagonal(q, 0.0)
+            np.fill_diagonal(q, -q.sum(axis=1))
+            q.setflags(write=False)
+            self._derived["generator"] = q
+        return q
+
+    def exit_rates(self) -> np.ndarray:
+        """Rate ``-Q[i, i]`` at which each state is left, per second."""
+        return -np.diagonal(self.generator())
+
+    def _bucket(self, elapsed: float) -> int:
+        return round(math.log(elapsed) / self._log_base)
+
+    def _uniformized(self, t: float) -> np.ndarray:
+        q = self.generator()
+        n = len(q)
+        rate = float(-q.diagonal().min()) if n else 0.0
+        if rate * t <= 0.0:
+            return np.eye(n)
+        # expm(Q t) = expm(Q h) ** (2 ** m); keep the Poisson series short
+        squarings = max(0, math.ceil(math.log2(rate * t / self._MAX_RATE_TIME)))
+        lam = rate * t / 2**squarings
+        # Uniformized jump chain: expm(Q h) = sum_k Poisson(k; lam) * P**k
+        jump = np.eye(n) + q / rate
+        term = np.eye(n)
+        weight = math.exp(-lam)
+        result = weight * term
+        mass = weight
+        k = 0
+        while 1.0 - mass > self._TOL:
+            k += 1
+            term = term @ jump
+            weight *= lam / k
+            result += weight * term
+            mass += weight
+        result /= mass
+        for _ in range(squarings):
+            result = result @ result
+        return result
+
+    def transition_matrix(self, elapsed: float) -> np.ndarray:
+        """``expm(Q t)`` for ``t = elapsed`` seconds (``S x S``, read-only).
+
+        ``elapsed`` is rounded to its bucket and the matrix is kept in an LRU
+        cache of ``EXPM_CACHE`` entries.
+        """
+        if elapsed <= 0:
+            return np.eye(len(self.states))
+        key = self._bucket(elapsed)
+        cached = self._expm.get(key)
+        if cached is not None:
+            self._expm.move_to_end(key)
+            return cached
+        result = self._uniformized(math.exp(key * self._log_base))
+        result.setflags(write=False)
+        self._expm[key] = result
+        if len(self._expm) > self.EXPM_CACHE:
+            self._expm.popitem(last=False)
+        return result
+
+    def transition_prob(self, a: Hashable, b: Hashable, elapsed: float) -> float:
+        """Probability of being in ``b`` ``elapsed`` seconds after ``a``."""
+        return float(self.transition_matrix(elapsed)[self._index[a], self._index[b]])
+
+    def transition_score(self, a: Hashable, b: Hashable, elapsed: float) -> float:
+        """Return the anomaly score ``-log P(b | a, elapsed)``."""
+        p = self.transition_prob(a, b, elapsed)
+        return -math.log(p) if p > 0 else math.inf
+
+    def stationary_distribution(self) -> np.ndarray:
+        """Stationary distribution ``pi Q = 0``, normalised to sum to one."""
+        pi = self._derived.get("stationary")
+        if pi is None:
+            n = len(self.states)
+            if not n:
+                pi = np.empty(0)
+            else:
+                # Replace one balance equation with the normalisation
+                system = np.array(self.generator().T)
+                system[-1] = 1.0
+                rhs = np.zeros(n)
+                rhs[-1] = 1.0
+                pi = np.linalg.solve(system, rhs)
+            pi.setflags(write=False)
+            self._derived["stationary"] = pi
+        return pi
+
+    # Scoring whole sequences
+
+    def score_encoded(self, codes: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """Scores ``-log P(x_t | x_{t-1}, dt)`` for ``t >= 1``.
+
+        Intervals are grouped by bucket, so each distinct bucket costs one
+        cached matrix and one gather.
+        """
+        x = np.asarray(codes, dtype=np.int64)
+        if len(x) and (x.min() < 0 or x.max() >= len(self.states)):
+            raise ValueError("state index out of range")
+        dt = np.diff(np.asarray(times, dtype=np.float64))
+        a, b = x[:-1], x[1:]
+        probs = (a == b).astype(np.float64)  # zero-length gaps
+        positive = np.flatnonzero(dt > 0)
+        if len(positive):
+            keys = np.rint(np.log(dt[positive]) / self._log_base).astype(np.int64)
+            buckets, inverse = np.unique(keys, return_inverse=True)
+            for i, key in enumerate(buckets):
+                rows = positive[inverse.reshape(-1) == i]
+                matrix = self.transition_matrix(math.exp(key * self._log_base))
+                probs[rows] = matrix[a[rows], b[rows]]
+        with np.errstate(divide="ignore"):
+            return 0.0 - np.log(probs)
+
+    def sequence_loglik(self, sequence: Iterable[Hashable], timestamps: Iterable[float]) -> float:
+        """Log-likelihood of a timestamped sequence under the model."""
+        times = np.asarray(list(timestamps), dtype=np.float64)
+        return -float(self.score_encoded(self.encode(sequence), times).sum())
+
+    def anomaly_scores(
+        self, sequence: Iterable[Hashable], timestamps: Iterable[float]
+    ) -> List[float]:
+        """Negative log-probability for each transition in ``sequence``."""
+        times = np.asarray(list(timestamps), dtype=np.float64)
+        return self.score_encoded(self.encode(sequence), times).tolist()
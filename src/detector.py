@@ -3,11 +3,13 @@ from __future__ import annotations
 """Anomaly detection pipeline for NMEA 2000 traffic."""
 
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
 import math
 
+from .binning import QuantileSketch
+from .ctmc import ContinuousTimeMarkovChain
 from .markov_model import MarkovChain
-from .parser import Message
+from .parser import Message, MessageBatch
 from . import features
 
 
@@ -18,135 +20,412 @@ class Anomaly:
     value: float
     score: float
     reason: str
+    state: str | None = None
+
+
+class _RunningStats:
+    """Welford accumulator for mean and population standard deviation."""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def result(self) -> Tuple[float, float]:
+        return self.mean, math.sqrt(self.m2 / self.n)
+
+
+class _GapStats:
+    """Median inter-arrival time of one message stream, in bounded memory.
+
+    The sketch is seeded from the stream ``key``, so learned periods do not
+    change from run to run.
+    """
+
+    __slots__ = ("sketch", "buffer", "last")
+
+    def __init__(self, key: int | str) -> None:
+        self.sketch = QuantileSketch(seed=f"gap:{key}")
+        self.buffer: List[float] = []
+        self.last: float | None = None
+
+    def add(self, timestamp: float) -> None:
+        if self.last is not None and timestamp > self.last:
+            self.buffer.append(timestamp - self.last)
+            if len(self.buffer) >= 1024:
+                self.flush()
+        self.last = timestamp
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.sketch.update(self.buffer)
+            self.buffer.clear()
+
+    def period(self) -> float | None:
+        self.flush()
+        return self.sketch.quantile(0.5) if self.sketch.n else None
 
 
 class AnomalyDetector:
-    """Combines Markov and statistical checks for anomaly detection."""
+    """Combines Markov and statistical checks for anomaly detection.
+
+    ``joint_states`` lists the :class:`features.JointState` combinations to
+    check for correlation; one transition model is kept per joint state in
+    :attr:`corr_models`, keyed by its name.
+
+    For drifting traffic, ``decay`` (per second) or ``window`` (seconds)
+    makes every transition model forget old data; see :class:`MarkovChain`.
+    With ``adapt`` the detector keeps learning while scoring: transitions
+    and values that are not flagged are fed back into the models.
+
+    With ``gap_aware`` a transition is scored against the ``k``-step matrix
+    ``P**k``, where ``k`` is the number of nominal periods since the previous
+    message of the stream (capped at ``max_gap``).  Periods are learned as
+    the median inter-arrival time per PGN and joint state and kept in
+    :attr:`periods`, where they may also be set by hand.  This avoids false
+    transition alarms when messages are dropped on a lossy bus.
+
+    With ``continuous_time`` every stream is modelled by a
+    :class:`ContinuousTimeMarkovChain` instead, and each transition is scored
+    by ``expm(Q dt)`` for the actual time ``dt`` since the previous message.
+    This handles jittery and differing rates directly, so ``gap_aware`` is
+    not needed; it cannot be combined with ``decay`` or ``window``.
+    """
 
-    def __init__(self, transition_threshold: float = 5.0, range_k: float = 3.0):
+    # Forgetting and continuous-time models are trained in chunks of this
+    # many transitions
+    TRAIN_CHUNK = 4096
+
+    def __init__(
+        self,
+        transition_threshold: float = 5.0,
+        range_k: float = 3.0,
+        joint_states: Sequence[features.JointState] = (features.RPM_SPEED,),
+        decay: float | None = None,
+        window: float | None = None,
+        adapt: bool = False,
+        gap_aware: bool = False,
+        max_gap: int = 64,
+        continuous_time: bool = False,
+    ):
+        names = [joint.name for joint in joint_states]
+        if len(set(names)) != len(names):
+            raise ValueError("joint state names must be unique")
+        if continuous_time and (decay is not None or window is not None):
+            raise ValueError("continuous_time cannot be combined with decay or window")
         self.transition_threshold = transition_threshold
         self.range_k = range_k
-        self.models: Dict[int, MarkovChain] = {}
+        self.joint_states = list(joint_states)
+        self.decay = decay
+        self.window = window
+        self.adapt = adapt
+        self.gap_aware = gap_aware
+        self.max_gap = max_gap
+        self.continuous_time = continuous_time
+        self.periods: Dict[int | str, float] = {}
+        self.models: Dict[int, MarkovChain | ContinuousTimeMarkovChain] = {}
         self.stats: Dict[Tuple[int, str], Tuple[float, float]] = {}
-        self.corr_model: MarkovChain | None = None
+        self.corr_models: Dict[str, MarkovChain | ContinuousTimeMarkovChain] = {}
+        # Training state kept between update() calls
+        self._values: Dict[Tuple[int, str], _RunningStats] = {}
+        self._prev_state: Dict[int, int] = {}
+        self._prev_corr: Dict[str, int] = {}
+        self._gaps: Dict[int | str, _GapStats] = {}
+
+    @property
+    def corr_model(self) -> MarkovChain | ContinuousTimeMarkovChain | None:
+        """The RPM/speed correlation model, if trained."""
+        return self.corr_models.get(features.RPM_SPEED.name)
+
+    def train(self, steps: Iterable[Dict[int, Message]] | MessageBatch) -> None:
+        """Fit per-PGN transition models, range statistics and correlations.
 
-    def _update_stats(self, values: List[float]) -> Tuple[float, float]:
-        mean = sum(values) / len(values)
-        var = sum((v - mean) ** 2 for v in values) / len(values)
-        std = math.sqrt(var)
-        return mean, std
+        ``steps`` is consumed in a single pass and only transition counts and
+        running moments are retained, so arbitrarily long streams (e.g. from
+        :func:`parser.iter_steps`) can be used with constant memory.  A
+        :class:`MessageBatch` is grouped into steps by timestamp.
+        """
+        self.models = {}
+        self.stats = {}
+        self.corr_models = {}
+        self._values = {}
+        self._prev_state = {}
+        self._prev_corr = {}
+        self._gaps = {}
+        self.periods = {}
+        self.update(steps)
 
-    def train(self, steps: Iterable[Dict[int, Message]]) -> None:
-        sequences: Dict[int, List[str]] = {}
-        values: Dict[Tuple[int, str], List[float]] = {}
-        corr_sequence: List[str] = []
+    def update(self, steps: Iterable[Dict[int, Message]] | MessageBatch) -> None:
+        """Incrementally train on more ``steps``, e.g. a new day of data.
+
+        Transition counts and range statistics are added to those already
+        learned, and the last state of each PGN and joint state carries over
+        from the previous call.  States not seen before are added to the
+        models; only the touched transition rows are renormalised.
+        """
+        if isinstance(steps, MessageBatch):
+            steps = steps.iter_steps()
+        # Forgetting models need transitions in order with their times, and
+        # continuous-time models need the time elapsed since the last state.
+        # Both are buffered per stream and fed to the model chunk by chunk
+        timed = self.decay is not None or self.window is not None or self.continuous_time
+        counts: Dict[int, Dict[Tuple[int, int], int]] = {}
+        events: Dict[int, List[Tuple[Tuple[int, int], float]]] = {}
+        seen: Dict[int, set[int]] = {}
+        prev_state = self._prev_state
+        values = self._values
+        corr_counts: Dict[str, Dict[Tuple[int, int], int]] = {}
+        corr_events: Dict[str, List[Tuple[Tuple[int, int], float]]] = {}
+        corr_states: Dict[str, set[int]] = {}
+        prev_corr = self._prev_corr
+        gaps = self._gaps
 
         for step in steps:
             for pgn, msg in step.items():
-                state = features.message_state(msg)
-                sequences.setdefault(pgn, []).append(state)
+                gap = gaps.get(pgn)
+                if gap is None:
+                    gap = gaps[pgn] = _GapStats(pgn)
+                last = gap.last
+                gap.add(msg.timestamp)
+                state = features.message_state_code(msg)
+                seen.setdefault(pgn, set()).add(state)
+                pgn_counts = counts.setdefault(pgn, {})
+                prev = prev_state.get(pgn)
+                if prev is not None:
+                    pair = (prev, state)
+                    if timed:
+                        when = msg.timestamp - last if self.continuous_time else msg.timestamp
+                        pgn_events = events.setdefault(pgn, [])
+                        pgn_events.append((pair, when))
+                        if len(pgn_events) >= self.TRAIN_CHUNK:
+                            model = self.models.get(pgn)
+                            self.models[pgn] = self._fit(model, seen[pgn], {}, pgn_events)
+                            pgn_events.clear()
+                    else:
+                        pgn_counts[pair] = pgn_counts.get(pair, 0) + 1
+                prev_state[pgn] = state
                 for k, v in msg.fields.items():
-                    values.setdefault((pgn, k), []).append(v)
-            if features.PGN_ENGINE in step and features.PGN_SPEED in step:
-                corr_sequence.append(
-                    features.rpm_speed_state(
-                        step[features.PGN_ENGINE], step[features.PGN_SPEED]
-                    )
-                )
+                    stats = values.get((pgn, k))
+                    if stats is None:
+                        stats = values[(pgn, k)] = _RunningStats()
+                    stats.add(v)
+            for joint in self.joint_states:
+                corr_state = joint.code(step)
+                if corr_state is None:
+                    continue
+                gap = gaps.get(joint.name)
+                if gap is None:
+                    gap = gaps[joint.name] = _GapStats(joint.name)
+                timestamp = step[joint.pgns[0]].timestamp
+                last = gap.last
+                gap.add(timestamp)
+                corr_states.setdefault(joint.name, set()).add(corr_state)
+                joint_counts = corr_counts.setdefault(joint.name, {})
+                prev = prev_corr.get(joint.name)
+                if prev is not None:
+                    pair = (prev, corr_state)
+                    if timed:
+                        when = timestamp - last if self.continuous_time else timestamp
+                        joint_events = corr_events.setdefault(joint.name, [])
+                        joint_events.append((pair, when))
+                        if len(joint_events) >= self.TRAIN_CHUNK:
+                            model = self.corr_models.get(joint.name)
+                            self.corr_models[joint.name] = self._fit(
+                                model, corr_states[joint.name], {}, joint_events
+                            )
+                            joint_events.clear()
+                    else:
+                        joint_counts[pair] = joint_counts.get(pair, 0) + 1
+                prev_corr[joint.name] = corr_state
+
+        for pgn, pgn_counts in counts.items():
+            model = self.models.get(pgn)
+            self.models[pgn] = self._fit(model, seen[pgn], pgn_counts, events.get(pgn))
+
+        for key, stats in values.items():
+            self.stats[key] = stats.result()
+
+        for key, gap in gaps.items():
+            period = gap.period()
+            if period is not None:
+                self.periods[key] = period
+
+        for name, states in corr_states.items():
+            model = self.corr_models.get(name)
+            self.corr_models[name] = self._fit(
+                model, states, corr_counts[name], corr_events.get(name)
+            )
+
+    def _fit(
+        self,
+        model: MarkovChain | ContinuousTimeMarkovChain | None,
+        states: set[int],
+        counts: Dict[Tuple[int, int], int],
+        events: List[Tuple[Tuple[int, int], float]] | None = None,
+    ) -> MarkovChain | ContinuousTimeMarkovChain:
+        if self.continuous_time:
+            if model is None:
+                model = ContinuousTimeMarkovChain(sorted(states))
+            else:
+                model.add_states(sorted(states))
+            if events:
+                pairs, durations = zip(*events)
+                model.add_transitions(pairs, durations)
+            return model
+        if model is None:
+            model = MarkovChain(sorted(states), decay=self.decay, window=self.window)
+        else:
+            model.add_states(sorted(states))
+        if events:
+            pairs, times = zip(*events)
+            model.add_transitions(pairs, times)
+        else:
+            model.fit_counts(counts)
+        return model
 
-        for pgn, seq in sequences.items():
-            states = sorted(set(seq))
-            model = MarkovChain(states)
-            model.fit(seq)
-            self.models[pgn] = model
+    def _gap_steps(self, key: int | str, elapsed: float) -> int:
+        """Number of nominal periods in ``elapsed`` seconds (1 unless gap-aware)."""
+        period = self.periods.get(key) if self.gap_aware else None
+        if not period or elapsed <= 0:
+            return 1
+        return min(self.max_gap, max(1, round(elapsed / period)))
 
-        for key, vals in values.items():
-            self.stats[key] = self._update_stats(vals)
+    def _score_transition(
+        self,
+        model: MarkovChain | ContinuousTimeMarkovChain,
+        key: int | str,
+        a: int,
+        b: int,
+        timestamp: float,
+        elapsed: float,
+    ) -> float:
+        """Score ``a -> b``; when adapting, learn it unless it is flagged."""
+        if self.continuous_time:
+            score = model.transition_score(a, b, elapsed)
+            if self.adapt and score <= self.transition_threshold:
+                model.observe(a, b, elapsed, defer=True)
+            return score
+        n_steps = self._gap_steps(key, elapsed)
+        score = model.k_step_score(a, b, n_steps)
+        # Only single steps are evidence about P itself
+        if self.adapt and n_steps == 1 and score <= self.transition_threshold:
+            model.observe(a, b, timestamp, defer=True)
+        return score
 
-        if corr_sequence:
-            states = sorted(set(corr_sequence))
-            self.corr_model = MarkovChain(states)
-            self.corr_model.fit(corr_sequence)
+    def score(self, steps: Iterable[Dict[int, Message]] | MessageBatch) -> List[Anomaly]:
+        """Score ``steps`` and return all detected anomalies as a list."""
+        return list(self.iter_score(steps))
 
-    def score(self, steps: Iterable[Dict[int, Message]]) -> List[Anomaly]:
-        anomalies: List[Anomaly] = []
-        prev_state: Dict[int, str] = {}
-        prev_corr: str | None = None
+    def iter_score(
+        self, steps: Iterable[Dict[int, Message]] | MessageBatch
+    ) -> Iterator[Anomaly]:
+        """Lazily score ``steps``, yielding anomalies as they are found.
+
+        States are handled as integer codes throughout; labels are only
+        built for the ``state`` of reported anomalies.
+        """
+        if isinstance(steps, MessageBatch):
+            steps = steps.iter_steps()
+        prev_state: Dict[int, int] = {}
+        prev_corr: Dict[str, int] = {}
+        prev_time: Dict[int | str, float] = {}
+        joints = [j for j in self.joint_states if j.name in self.corr_models]
 
         for step in steps:
             # Transition and range checks
             for pgn, msg in step.items():
                 if pgn not in self.models:
                     continue
-                state = features.message_state(msg)
+                state = features.message_state_code(msg)
                 model = self.models[pgn]
-                if state not in model.states:
-                    anomalies.append(
-                        Anomaly(
-                            timestamp=msg.timestamp,
-                            pgn=pgn,
-                            value=list(msg.fields.values())[0],
-                            score=float("inf"),
-                            reason="unknown_state",
-                        )
+                if state not in model:
+                    yield Anomaly(
+                        timestamp=msg.timestamp,
+                        pgn=pgn,
+                        value=list(msg.fields.values())[0],
+                        score=float("inf"),
+                        reason="unknown_state",
+                        state=features.state_label(state),
                     )
                 else:
                     if pgn in prev_state:
-                        prob = model.transition_prob(prev_state[pgn], state)
-                        score = -math.log(prob)
+                        score = self._score_transition(
+                            model,
+                            pgn,
+                            prev_state[pgn],
+                            state,
+                            msg.timestamp,
+                            msg.timestamp - prev_time[pgn],
+                        )
                         if score > self.transition_threshold:
-                            anomalies.append(
-                                Anomaly(
-                                    timestamp=msg.timestamp,
-                                    pgn=pgn,
-                                    value=list(msg.fields.values())[0],
-                                    score=score,
-                                    reason="transition",
-                                )
+                            yield Anomaly(
+                                timestamp=msg.timestamp,
+                                pgn=pgn,
+                                value=list(msg.fields.values())[0],
+                                score=score,
+                                reason="transition",
+                                state=features.state_label(state),
                             )
                     prev_state[pgn] = state
+                    prev_time[pgn] = msg.timestamp
                 for k, v in msg.fields.items():
                     mean, std = self.stats.get((pgn, k), (0.0, 0.0))
                     if std and abs(v - mean) > self.range_k * std:
-                        anomalies.append(
-                            Anomaly(
-                                timestamp=msg.timestamp,
-                                pgn=pgn,
-                                value=v,
-                                score=abs(v - mean) / std,
-                                reason=f"range_{k}",
-                            )
+                        yield Anomaly(
+                            timestamp=msg.timestamp,
+                            pgn=pgn,
+                            value=v,
+                            score=abs(v - mean) / std,
+                            reason=f"range_{k}",
                         )
+                    elif self.adapt and (pgn, k) in self._values:
+                        stats = self._values[(pgn, k)]
+                        stats.add(v)
+                        self.stats[(pgn, k)] = stats.result()
 
-            # Correlation check
-            if self.corr_model and features.PGN_ENGINE in step and features.PGN_SPEED in step:
-                corr_state = features.rpm_speed_state(
-                    step[features.PGN_ENGINE], step[features.PGN_SPEED]
-                )
-                if corr_state not in self.corr_model.states:
-                    anomalies.append(
-                        Anomaly(
-                            timestamp=step[features.PGN_ENGINE].timestamp,
-                            pgn=features.PGN_ENGINE,
-                            value=step[features.PGN_ENGINE].fields["rpm"],
-                            score=float("inf"),
-                            reason="unknown_corr_state",
-                        )
+            # Correlation checks
+            for joint in joints:
+                corr_state = joint.code(step)
+                if corr_state is None:
+                    continue
+                model = self.corr_models[joint.name]
+                msg = step[joint.pgns[0]]
+                if corr_state not in model:
+                    yield Anomaly(
+                        timestamp=msg.timestamp,
+                        pgn=msg.pgn,
+                        value=list(msg.fields.values())[0],
+                        score=float("inf"),
+                        reason="unknown_corr_state",
+                        state=joint.label(step),
                     )
                 else:
-                    if prev_corr is not None:
-                        prob = self.corr_model.transition_prob(prev_corr, corr_state)
-                        score = -math.log(prob)
+                    prev = prev_corr.get(joint.name)
+                    if prev is not None:
+                        score = self._score_transition(
+                            model,
+                            joint.name,
+                            prev,
+                            corr_state,
+                            msg.timestamp,
+                            msg.timestamp - prev_time[joint.name],
+                        )
                         if score > self.transition_threshold:
-                            anomalies.append(
-                                Anomaly(
-                                    timestamp=step[features.PGN_ENGINE].timestamp,
-                                    pgn=features.PGN_ENGINE,
-                                    value=step[features.PGN_ENGINE].fields["rpm"],
-                                    score=score,
-                                    reason="correlation_rpm_speed",
-                                )
+                            yield Anomaly(
+                                timestamp=msg.timestamp,
+                                pgn=msg.pgn,
+                                value=list(msg.fields.values())[0],
+                                score=score,
+                                reason=f"correlation_{joint.name}",
+                                state=joint.label(step),
                             )
-                    prev_corr = corr_state
-
-        return anomalies
+                    prev_corr[joint.name] = corr_state
+                    prev_time[joint.name] = msg.timestamp
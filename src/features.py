@@ -2,8 +2,14 @@ from __future__ import annotations
 
 """Feature engineering utilities for NMEA 2000 messages."""
 
-from typing import Dict
-from .parser import Message
+from bisect import bisect_right
+from itertools import product
+import math
+from typing import Dict, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from .parser import Message, MessageBatch
 
 # PGN identifiers used in the proof of concept
 PGN_HEADING = 127250
@@ -40,31 +46,341 @@ _PGN_LABEL = {
 }
 
 
-def _discretize(value: float, bins: list[float], labels: list[str]) -> str:
-    for i in range(len(bins) - 1):
-        if bins[i] <= value < bins[i + 1]:
-            return labels[i]
-    return labels[-1]
+class FieldBins:
+    """Compiled bin table for one field of one PGN.
+
+    ``edges`` are sorted bin boundaries; bin ``i`` covers
+    ``edges[i] <= value < edges[i + 1]`` and anything outside the edges falls
+    into the last bin.  :meth:`index` (``bisect``) and :meth:`indices`
+    (``searchsorted``) share the same edges and always agree.
+    """
+
+    __slots__ = ("key", "edges", "array", "labels", "radix")
+
+    def __init__(self, key: str, edges: Sequence[float], labels: Sequence[str]):
+        if len(labels) != len(edges) - 1:
+            raise ValueError(f"{key}: expected {len(edges) - 1} labels, got {len(labels)}")
+        if any(b < a for a, b in zip(edges, edges[1:])):
+            raise ValueError(f"{key}: bin edges must be sorted")
+        self.key = key
+        self.edges = list(map(float, edges))
+        self.array = np.asarray(self.edges, dtype=np.float64)
+        self.labels = list(labels)
+        # One extra digit for "field missing" in state codes
+        self.radix = len(self.labels) + 1
+
+    def index(self, value: float) -> int:
+        """Bin index of a single ``value``."""
+        i = bisect_right(self.edges, value) - 1
+        return i if 0 <= i < len(self.labels) else len(self.labels) - 1
+
+    def indices(self, values: np.ndarray) -> np.ndarray:
+        """Bin indices of a column of ``values``; NaN maps to ``-1``."""
+        idx = np.searchsorted(self.array, values, side="right") - 1
+        idx[(idx < 0) | (idx >= len(self.labels))] = len(self.labels) - 1
+        idx[np.isnan(values)] = -1
+        return idx
+
+
+BinTables = Dict[int, Tuple[FieldBins, ...]]
+
+
+def compile_bins(
+    bins: Mapping[int, Mapping[str, Sequence[float]]],
+    labels: Mapping[int, Mapping[str, Sequence[str]]],
+) -> BinTables:
+    """Compile ``_BINS``-style edges and ``_LABELS``-style names into tables."""
+
+    return {
+        pgn: tuple(FieldBins(key, edges, labels[pgn][key]) for key, edges in fields.items())
+        for pgn, fields in bins.items()
+    }
+
+
+_DEFAULT_TABLES: BinTables = compile_bins(_BINS, _LABELS)
+_TABLES: BinTables = dict(_DEFAULT_TABLES)
+
+
+# Integer state codes
+#
+# A state is the mixed-radix number formed by the PGN followed by one digit
+# per binned field.  Digit 0 means the field is missing and digit ``i + 1``
+# means bin ``i``, so the code ``pgn << STATE_BITS`` is the "unknown" state.
+STATE_BITS = 16
+_STATE_MASK = (1 << STATE_BITS) - 1
+
+
+def message_state_code(msg: Message) -> int:
+    """Return the integer state code for ``msg``.
+
+    Equivalent to :func:`message_state` but without building strings; use
+    :func:`state_label` to turn a code back into its label.
+    """
+
+    code = 0
+    fields = msg.fields
+    for table in _TABLES.get(msg.pgn, ()):
+        code *= table.radix
+        value = fields.get(table.key)
+        if value is not None:
+            code += table.index(value) + 1
+    return (msg.pgn << STATE_BITS) | code
+
+
+def _code_label(code: int) -> str:
+    pgn, local = code >> STATE_BITS, code & _STATE_MASK
+    parts: list[str] = []
+    for table in reversed(_TABLES.get(pgn, ())):
+        local, digit = divmod(local, table.radix)
+        if digit:
+            parts.append(table.labels[digit - 1])
+    parts.reverse()
+    pgn_label = _PGN_LABEL.get(pgn, str(pgn))
+    return f"{pgn_label}_" + "_".join(parts or ["unknown"])
+
+
+class StateVocabulary:
+    """Bidirectional mapping between integer state codes and labels.
+
+    Labels are built on first request and cached, so hot paths can work on
+    codes alone and only pay for a string when one is displayed.
+    """
+
+    def __init__(self) -> None:
+        self._labels: Dict[int, str] = {}
+        self._codes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def clear(self) -> None:
+        """Forget cached labels, e.g. after the bin tables changed."""
+        self._labels.clear()
+        self._codes.clear()
+
+    def label(self, code: int) -> str:
+        """Return the human-readable label for state ``code``."""
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _code_label(code)
+            self._codes[label] = code
+        return label
+
+    def code(self, label: str) -> int:
+        """Return the state code for ``label``; raises ``KeyError`` if invalid."""
+        code = self._codes.get(label)
+        if code is None:
+            self._enumerate(label.split("_", 1)[0])
+            code = self._codes[label]
+        return code
+
+    def _enumerate(self, pgn_label: str) -> None:
+        pgns = [p for p, name in _PGN_LABEL.items() if name == pgn_label]
+        if not pgns and pgn_label.isdigit():
+            pgns = [int(pgn_label)]
+        for pgn in pgns:
+            radices = [table.radix for table in _TABLES.get(pgn, ())]
+            for digits in product(*(range(r) for r in radices)):
+                local = 0
+                for digit, radix in zip(digits, radices):
+                    local = local * radix + digit
+                self.label((pgn << STATE_BITS) | local)
+
+
+VOCABULARY = StateVocabulary()
+state_label = VOCABULARY.label
+state_code = VOCABULARY.code
+
+
+def bin_tables() -> BinTables:
+    """Return a copy of the bin tables currently in use."""
+
+    return dict(_TABLES)
+
+
+def set_bins(tables: Mapping[int, Sequence[FieldBins]]) -> None:
+    """Install bin tables at runtime, e.g. from :class:`binning.BinLearner`.
+
+    Tables replace the current ones PGN by PGN; other PGNs keep theirs.
+    State codes depend on the tables, so models trained before the change
+    must be retrained.
+    """
+
+    global _TABLES
+    for pgn, fields in tables.items():
+        if math.prod(table.radix for table in fields) > 1 << STATE_BITS:
+            raise ValueError(f"PGN {pgn}: too many bins to fit a state code")
+    _TABLES = {**_TABLES, **{pgn: tuple(fields) for pgn, fields in tables.items()}}
+    VOCABULARY.clear()
+
+
+def reset_bins() -> None:
+    """Restore the built-in bin tables."""
+
+    global _TABLES
+    _TABLES = dict(_DEFAULT_TABLES)
+    VOCABULARY.clear()
 
 
 def message_state(msg: Message) -> str:
     """Return discretized state label for ``msg``."""
 
-    pgn_label = _PGN_LABEL.get(msg.pgn, str(msg.pgn))
-    fields = _BINS.get(msg.pgn, {})
-    labels = _LABELS.get(msg.pgn, {})
-    parts: list[str] = []
-    for key, bins in fields.items():
-        if key in msg.fields:
-            parts.append(_discretize(msg.fields[key], bins, labels[key]))
-    if not parts:
-        parts.append("unknown")
-    return f"{pgn_label}_" + "_".join(parts)
+    return state_label(message_state_code(msg))
+
+
+def batch_state_codes(batch: MessageBatch) -> np.ndarray:
+    """Vectorised :func:`message_state_code` for every row of ``batch``.
+
+    Returns an ``int64`` array of state codes aligned with the batch rows.
+    NaN values are treated as missing fields.
+    """
+
+    codes = np.empty(len(batch), dtype=np.int64)
+    for pgn in np.unique(batch.pgns).tolist():
+        rows = np.flatnonzero(batch.pgns == pgn)
+        local = np.zeros(len(rows), dtype=np.int64)
+        for table in _TABLES.get(pgn, ()):
+            local *= table.radix
+            col = batch.columns.get(table.key)
+            if col is not None:
+                local += table.indices(col[rows]) + 1
+        codes[rows] = (pgn << STATE_BITS) | local
+    return codes
+
+
+def batch_bins(batch: MessageBatch) -> Dict[Tuple[int, str], np.ndarray]:
+    """Bin indices of every binned PGN/field pair in ``batch``.
+
+    Each ``(pgn, field)`` entry is an ``int64`` array aligned with the batch
+    rows holding the field's bin index, or ``-1`` where the row belongs to
+    another PGN or the value is missing.
+    """
+
+    out: Dict[Tuple[int, str], np.ndarray] = {}
+    for pgn in np.unique(batch.pgns).tolist():
+        tables = _TABLES.get(pgn, ())
+        if not tables:
+            continue
+        rows = np.flatnonzero(batch.pgns == pgn)
+        for table in tables:
+            idx = np.full(len(batch), -1, dtype=np.int64)
+            col = batch.columns.get(table.key)
+            if col is not None:
+                idx[rows] = table.indices(col[rows])
+            out[(pgn, table.key)] = idx
+    return out
+
+
+def batch_states(batch: MessageBatch) -> np.ndarray:
+    """Vectorised :func:`message_state` for every row of ``batch``.
+
+    Returns an object array of state labels aligned with the batch rows.
+    NaN values are treated as missing fields.
+    """
+
+    # Few distinct states exist, so label each one only once
+    uniq, inverse = np.unique(batch_state_codes(batch), return_inverse=True)
+    names = np.empty(len(uniq), dtype=object)
+    names[:] = [state_label(c) for c in uniq.tolist()]
+    return names[inverse.reshape(-1)]
+
+
+# Joint states
+#
+# A joint state combines the state codes of several PGNs observed in the same
+# step.  Codes are mixed into a 63-bit hash instead of a dense product index,
+# so the combinatorial state space is never enumerated; only combinations
+# that actually occur end up in a model.
+_HASH_SEED = 0xCBF29CE484222325
+_HASH_MUL = 0x9E3779B97F4A7C15
+_HASH_MASK = (1 << 64) - 1
+
+
+class JointState:
+    """Sparse joint state over a tuple of PGNs.
+
+    Parameters
+    ----------
+    pgns:
+        PGNs whose message states are combined, e.g. ``(PGN_HEADING,
+        PGN_WIND)``.  A step only has a joint state when all are present.
+    name:
+        Identifier used in anomaly reasons; defaults to the PGN labels.
+    """
+
+    def __init__(self, pgns: Sequence[int], name: str | None = None):
+        if not pgns:
+            raise ValueError("a joint state needs at least one PGN")
+        self.pgns: Tuple[int, ...] = tuple(pgns)
+        self.name = name or "_".join(
+            _PGN_LABEL.get(pgn, str(pgn)).lower() for pgn in self.pgns
+        )
+
+    def __repr__(self) -> str:
+        return f"JointState({self.pgns!r}, {self.name!r})"
+
+    def code(self, step: Mapping[int, Message]) -> int | None:
+        """Hashed joint state of ``step``, or ``None`` if a PGN is missing."""
+        h = _HASH_SEED
+        for pgn in self.pgns:
+            msg = step.get(pgn)
+            if msg is None:
+                return None
+            h = ((h ^ message_state_code(msg)) * _HASH_MUL) & _HASH_MASK
+        return h >> 1
+
+    def combine(self, columns: Sequence[np.ndarray]) -> np.ndarray:
+        """Hash aligned state-code columns, one per PGN in :attr:`pgns`.
+
+        Rows where any column is negative (missing) get ``-1``.  Produces the
+        same codes as :meth:`code`.
+        """
+        if len(columns) != len(self.pgns):
+            raise ValueError(f"expected {len(self.pgns)} columns, got {len(columns)}")
+        cols = [np.asarray(col, dtype=np.int64) for col in columns]
+        h = np.full(len(cols[0]), _HASH_SEED, dtype=np.uint64)
+        missing = np.zeros(len(cols[0]), dtype=bool)
+        for col in cols:
+            h = (h ^ col.astype(np.uint64)) * np.uint64(_HASH_MUL)
+            missing |= col < 0
+        out = (h >> np.uint64(1)).astype(np.int64)
+        out[missing] = -1
+        return out
+
+    def batch_codes(self, batch: MessageBatch) -> Tuple[np.ndarray, np.ndarray]:
+        """Joint states of a time-sorted ``batch``, one per step.
+
+        Returns ``(timestamps, codes)`` for the steps in which every PGN is
+        present.  As with :func:`parser.group_by_timestamp`, the last message
+        of a PGN within a step wins.
+        """
+        steps, inverse = np.unique(batch.timestamps, return_inverse=True)
+        states = batch_state_codes(batch)
+        columns = []
+        for pgn in self.pgns:
+            col = np.full(len(steps), -1, dtype=np.int64)
+            rows = np.flatnonzero(batch.pgns == pgn)
+            col[inverse[rows]] = states[rows]
+            columns.append(col)
+        codes = self.combine(columns)
+        keep = codes >= 0
+        return steps[keep], codes[keep]
+
+    def label(self, step: Mapping[int, Message]) -> str:
+        """Human-readable joint state of ``step``, e.g. ``RPM_1k_2k|SPD_10_20``."""
+        return "|".join(message_state(step[pgn]) for pgn in self.pgns)
+
+
+RPM_SPEED = JointState((PGN_ENGINE, PGN_SPEED), "rpm_speed")
+
+
+def rpm_speed_code(rpm_msg: Message, speed_msg: Message) -> int:
+    """Joint RPM/speed state code, the same hash as ``RPM_SPEED.code``."""
+
+    return RPM_SPEED.code({PGN_ENGINE: rpm_msg, PGN_SPEED: speed_msg})
 
 
 def rpm_speed_state(rpm_msg: Message, speed_msg: Message) -> str:
     """Joint state capturing RPM and speed correlation."""
 
-    rpm_state = message_state(rpm_msg)
-    speed_state = message_state(speed_msg)
-    return f"{rpm_state}|{speed_state}"
+    return RPM_SPEED.label({PGN_ENGINE: rpm_msg, PGN_SPEED: speed_msg})
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+"""Parallel ingestion of log files from a fleet of vessels.
+
+Each vessel records its own log.  :func:`load_fleet` parses one file per
+vessel concurrently in a process pool and returns compact per-vessel
+batches, while :func:`merge_fleet` and :func:`iter_fleet_steps` stream every
+vessel's traffic as one globally time-ordered sequence.  The merge runs a
+fixed number of producer processes, each parsing several vessels' logs on
+demand, and a heap merge in the calling process, so memory stays bounded by
+a few blocks per vessel no matter how long the logs are.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+from itertools import islice
+import multiprocessing
+import os
+from typing import Dict, Iterator, List, Mapping, Sequence, Tuple, Union
+
+from .parser import Message, MessageBatch, iter_messages, load_batch
+
+FleetSources = Union[Mapping[str, str], Sequence[str]]
+
+
+def vessel_id(path: str) -> str:
+    """Default vessel id for ``path``: the file name without extensions."""
+
+    return os.path.basename(os.fspath(path)).split(".", 1)[0]
+
+
+def _sources(sources: FleetSources) -> Dict[str, str]:
+    if isinstance(sources, Mapping):
+        return dict(sources)
+    named = {vessel_id(p): p for p in sources}
+    if len(named) != len(sources):
+        raise ValueError("vessel ids derived from file names are not unique")
+    return named
+
+
+def load_fleet(sources: FleetSources, workers: int | None = None) -> Dict[str, MessageBatch]:
+    """Parse every vessel log concurrently, one file per worker process.
+
+    ``sources`` maps vessel id to log path, or is a sequence of paths whose
+    file names serve as ids.  Returns a :class:`MessageBatch` per vessel;
+    use :meth:`MessageBatch.iter_steps` for per-vessel grouped steps.
+    """
+
+    named = _sources(sources)
+    if workers == 1 or len(named) <= 1:
+        return {vessel: load_batch(path) for vessel, path in named.items()}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        batches = pool.map(load_batch, named.values())
+        return dict(zip(named, batches))
+
+
+def _produce(
+    paths: Dict[int, str],
+    requests: multiprocessing.Queue,
+    queues: Dict[int, multiprocessing.Queue],
+    block: int,
+) -> None:
+    # Each request asks for the next block of one vessel; None stops
+    streams: Dict[int, Iterator[Message] | None] = {}
+    while True:
+        vessel = requests.get()
+        if vessel is None:
+            # Blocks requested ahead but never read are not needed
+            for queue in queues.values():
+                queue.cancel_join_thread()
+            return
+        queue = queues[vessel]
+        if vessel not in streams:
+            streams[vessel] = iter_messages(paths[vessel])
+        messages = streams[vessel]
+        if messages is None:
+            queue.put(None)
+            continue
+        try:
+            batch = MessageBatch.from_messages(islice(messages, block))
+        except BaseException as exc:  # forwarded to the consumer
+            streams[vessel] = None
+            queue.put(exc)
+            continue
+        if not len(batch):
+            streams[vessel] = None
+            queue.put(None)
+        else:
+            queue.put(batch)
+
+
+def _consume(
+    vessel: str,
+    index: int,
+    queue: multiprocessing.Queue,
+    requests: multiprocessing.Queue,
+    prefetch: int,
+) -> Iterator[Tuple[str, Message]]:
+    for _ in range(prefetch):
+        requests.put(index)
+    while True:
+        item = queue.get()
+        if item is None:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        requests.put(index)
+        for msg in item:
+            yield vessel, msg
+
+
+def merge_fleet(
+    sources: FleetSources,
+    block: int = 4096,
+    queue_size: int = 4,
+    workers: int | None = None,
+) -> Iterator[Tuple[str, Message]]:
+    """Yield ``(vessel_id, message)`` pairs from all logs in timestamp order.
+
+    Logs are parsed by at most ``workers`` processes (default: the number
+    of CPUs), each serving a share of the vessels in blocks of ``block``
+    messages.  A block is only parsed once the merge asks for it, and at
+    most ``queue_size`` blocks per vessel are requested ahead.  Each log
+    must be in timestamp order; ties across vessels keep the order of
+    ``sources``.
+    """
+
+    named = _sources(sources)
+    paths = list(named.values())
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+    ctx = multiprocessing.get_context()
+    queues = [ctx.Queue() for _ in paths]
+    requests = [ctx.Queue() for _ in range(workers)]
+    procs = []
+    try:
+        for w, worker_requests in enumerate(requests):
+            own = range(w, len(paths), workers)
+            proc = ctx.Process(
+                target=_produce,
+                args=(
+                    {i: paths[i] for i in own},
+                    worker_requests,
+                    {i: queues[i] for i in own},
+                    block,
+                ),
+                daemon=True,
+            )
+            proc.start()
+            procs.append(proc)
+        streams = [
+            _consume(vessel, i, queues[i], requests[i % workers], queue_size)
+            for i, vessel in enumerate(named)
+        ]
+        yield from heapq.merge(*streams, key=lambda item: item[1].timestamp)
+    finally:
+        for worker_requests in requests:
+            worker_requests.put(None)
+        for proc in procs:
+            proc.join(timeout=1.0)
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+        for queue in queues + requests:
+            queue.close()
+
+
+def iter_fleet_steps(
+    sources: FleetSources,
+    block: int = 4096,
+    queue_size: int = 4,
+    workers: int | None = None,
+) -> Iterator[Tuple[str, Dict[int, Message]]]:
+    """Stream ``(vessel_id, step)`` pairs, grouped per vessel by timestamp.
+
+    Built on :func:`merge_fleet`.  Since the merged messages arrive in
+    timestamp order, every open step is complete once a message with a
+    later timestamp arrives; at that point all of them are emitted.  Steps
+    therefore come out in global time order, and all pending steps share a
+    single timestamp.  Steps with equal timestamps come out in the order of
+    their first message.
+    """
+
+    pending: Dict[str, Dict[int, Message]] = {}
+    current: float | None = None
+    for vessel, msg in merge_fleet(sources, block, queue_size, workers):
+        if msg.timestamp != current:
+            yield from pending.items()
+            pending = {}
+            current = msg.timestamp
+        step = pending.get(vessel)
+        if step is None:
+            step = pending[vessel] = {}
+        step[msg.pgn] = msg
+    yield from pending.items()
@@ -5,11 +5,316 @@ from __future__ import annotations
 This module implements a first-order Markov chain that can be trained on a
 sequence of discrete states.  After fitting, transition probabilities and
 anomaly scores can be computed for new sequences.
+
+States are mapped to integer indices and transitions are kept in NumPy
+arrays, so fitting and scoring are array operations rather than per-pair
+dictionary lookups.  Small state spaces use a dense ``S x S`` matrix; large
+ones (e.g. joint states) use a sparse table whose memory grows with the
+number of distinct observed transitions instead of ``S**2``.  A forgetting
+table with exponentially decaying or sliding-window counts follows drifting
+traffic online.
 """
 
-from collections import defaultdict
+from collections import OrderedDict, deque
 import math
-from typing import Iterable, List
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+
+class _DenseTransitions:
+    """Dense ``S x S`` count matrix with smoothed probability and score tables.
+
+    The score table holds ``-log P(b|a)`` so that scoring is a plain gather.
+
+    Rows touched by :meth:`add` are marked stale and renormalised on the next
+    access, so an update costs ``O(rows touched * S)`` rather than ``S**2``.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.counts = np.zeros((n, n), dtype=np.int64)
+        # Laplace smoothing with no data: uniform rows
+        self._probs = np.full((n, n), 1.0 / n if n else 0.0)
+        self._scores = -np.log(self._probs)
+        self._dirty = np.zeros(n, dtype=bool)
+        self._stale = False
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes + self._probs.nbytes + self._scores.nbytes
+
+    @property
+    def probs(self) -> np.ndarray:
+        if self._stale:
+            self.normalise()
+        return self._probs
+
+    @property
+    def scores(self) -> np.ndarray:
+        if self._stale:
+            self.normalise()
+        return self._scores
+
+    def add(self, a: np.ndarray, b: np.ndarray, weights: np.ndarray | None = None) -> None:
+        if not len(a):
+            return
+        if len(a) * 8 < self.n * self.n:
+            # Small update: avoid an S**2 temporary
+            np.add.at(self.counts, (a, b), 1 if weights is None else weights)
+        else:
+            pairs = a * self.n + b
+            self.counts += np.bincount(
+                pairs, weights=weights, minlength=self.n * self.n
+            ).astype(np.int64).reshape(self.n, self.n)
+        self._dirty[a] = True
+        self._stale = True
+
+    def resize(self, n: int) -> None:
+        counts = np.zeros((n, n), dtype=np.int64)
+        counts[: self.n, : self.n] = self.counts
+        self.n = n
+        self.counts = counts
+        self._probs = np.empty((n, n))
+        self._scores = np.empty((n, n))
+        # The smoothing denominator depends on S, so every row changes
+        self._dirty = np.ones(n, dtype=bool)
+        self._stale = True
+
+    def normalise(self) -> None:
+        rows = np.flatnonzero(self._dirty)
+        if len(rows):
+            smoothed = self.counts[rows] + 1.0
+            probs = smoothed / smoothed.sum(axis=1, keepdims=True)
+            self._probs[rows] = probs
+            self._scores[rows] = -np.log(probs)
+            self._dirty[rows] = False
+        self._stale = False
+
+    def prob(self, i: int, j: int) -> float:
+        return float(self.probs[i, j])
+
+    def score(self, i: int, j: int) -> float:
+        return float(self.scores[i, j])
+
+    def scores_at(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return self.scores[a, b]
+
+    def matrix(self) -> np.ndarray:
+        return self.probs
+
+    def left_multiply(self, pi: np.ndarray) -> np.ndarray:
+        return pi @ self.probs
+
+
+class _SparseTransitions:
+    """Observed transition counts only, smoothed on demand.
+
+    Counts are stored as sorted ``a * S + b`` keys with matching counts, plus
+    per-row totals, and ``P(b|a) = (count + 1) / (row_total + S)``.
+    """
+
+    def __init__(self, n: int):
+        self.n = n
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.rows = np.zeros(n, dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.counts.nbytes + self.rows.nbytes
+
+    def add(self, a: np.ndarray, b: np.ndarray, weights: np.ndarray | None = None) -> None:
+        if not len(a):
+            return
+        if weights is None:
+            weights = np.ones(len(a), dtype=np.int64)
+        self.rows += np.bincount(a, weights=weights, minlength=self.n).astype(np.int64)
+        keys = a * self.n + b
+        if len(keys) > 1:
+            keys, inverse = np.unique(keys, return_inverse=True)
+            weights = np.bincount(inverse.reshape(-1), weights=weights)
+        weights = np.asarray(weights).astype(np.int64)
+        # Merge into the sorted keys: bump existing cells, insert only new ones
+        pos = np.searchsorted(self.keys, keys)
+        hit = pos < len(self.keys)
+        hit[hit] = self.keys[pos[hit]] == keys[hit]
+        self.counts[pos[hit]] += weights[hit]
+        if not hit.all():
+            miss = ~hit
+            self.keys = np.insert(self.keys, pos[miss], keys[miss])
+            self.counts = np.insert(self.counts, pos[miss], weights[miss])
+
+    def resize(self, n: int) -> None:
+        a, b = np.divmod(self.keys, max(self.n, 1))
+        self.keys = a * n + b
+        self.rows = np.concatenate((self.rows, np.zeros(n - self.n, dtype=np.int64)))
+        self.n = n
+
+    def _count(self, keys: np.ndarray) -> np.ndarray:
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[pos] == keys, self.counts[pos], 0)
+
+    def prob(self, i: int, j: int) -> float:
+        key = i * self.n + j
+        pos = int(np.searchsorted(self.keys, key))
+        hit = pos < len(self.keys) and self.keys[pos] == key
+        count = int(self.counts[pos]) if hit else 0
+        return (count + 1) / (int(self.rows[i]) + self.n)
+
+    def score(self, i: int, j: int) -> float:
+        return -math.log(self.prob(i, j))
+
+    def scores_at(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        counts = self._count(a * self.n + b)
+        return -np.log((counts + 1.0) / (self.rows[a] + self.n))
+
+    def matrix(self) -> np.ndarray:
+        counts = np.zeros(self.n * self.n)
+        counts[self.keys] = self.counts
+        smoothed = counts.reshape(self.n, self.n) + 1.0
+        return smoothed / (self.rows + self.n)[:, None]
+
+    def left_multiply(self, pi: np.ndarray) -> np.ndarray:
+        # pi @ P without materialising P: observed counts plus the +1 prior
+        a, b = np.divmod(self.keys, max(self.n, 1))
+        scaled = pi / (self.rows + self.n)
+        return np.bincount(b, weights=scaled[a] * self.counts, minlength=self.n) + scaled.sum()
+
+
+class _ForgettingTransitions:
+    """Sparse counts that forget old transitions.
+
+    With ``decay`` every existing count is multiplied by ``decay`` per time
+    unit.  Rather than touching every cell, new observations are added with
+    a growing weight ``w`` and true counts are ``stored / w``; all cells are
+    rescaled only when ``w`` gets large, so updates are O(1) amortised.
+
+    With ``window`` only transitions from the last ``window`` time units are
+    counted; expired transitions are evicted from a queue as time advances.
+
+    Time is given per transition, or advances by one per transition.
+    """
+
+    _MAX_WEIGHT = 1e100
+
+    def __init__(self, n: int, decay: float | None = None, window: float | None = None):
+        if (decay is None) == (window is None):
+            raise ValueError("exactly one of decay and window must be given")
+        if decay is not None and not 0.0 < decay <= 1.0:
+            raise ValueError("decay must be in (0, 1]")
+        if window is not None and window <= 0:
+            raise ValueError("window must be positive")
+        self.n = n
+        self.decay = decay
+        self.window = window
+        self.counts: Dict[int, float] = {}
+        self.rows = np.zeros(n)
+        # Time of the latest observation; None until the first one
+        self.clock: float | None = None
+        self._weight = 1.0
+        self._events: deque = deque()
+
+    @property
+    def nbytes(self) -> int:
+        # Rough estimate: dict slot, key and value objects per cell
+        cells = len(self.counts) * 100 + len(self._events) * 120
+        return self.rows.nbytes + cells
+
+    def add(
+        self,
+        a: np.ndarray,
+        b: np.ndarray,
+        weights: np.ndarray | None = None,
+        times: np.ndarray | None = None,
+    ) -> None:
+        a, b = np.asarray(a).tolist(), np.asarray(b).tolist()
+        w = [1.0] * len(a) if weights is None else np.asarray(weights).tolist()
+        t = [None] * len(a) if times is None else np.asarray(times).tolist()
+        for i, j, wi, ti in zip(a, b, w, t):
+            self.observe(i, j, wi, ti)
+
+    def observe(self, i: int, j: int, weight: float = 1.0, time: float | None = None) -> None:
+        if time is None:
+            time = 0.0 if self.clock is None else self.clock + 1.0
+        self._advance(time)
+        key = i * self.n + j
+        inc = weight * self._weight
+        self.counts[key] = self.counts.get(key, 0.0) + inc
+        self.rows[i] += inc
+        if self.window is not None:
+            self._events.append((self.clock, key, i, weight))
+
+    def _advance(self, time: float) -> None:
+        if self.clock is None:
+            self.clock = time
+            return
+        if time <= self.clock:
+            return
+        if self.decay is not None:
+            factor = self.decay ** (time - self.clock)
+            if factor == 0.0 or self._weight > self._MAX_WEIGHT * factor:
+                self._rescale(factor)
+            else:
+                self._weight /= factor
+        self.clock = time
+        events = self._events
+        horizon = time - self.window if self.window is not None else None
+        while events and events[0][0] <= horizon:
+            _, key, i, weight = events.popleft()
+            left = self.counts[key] - weight
+            if left > 0:
+                self.counts[key] = left
+            else:
+                del self.counts[key]
+            self.rows[i] -= weight
+
+    def _rescale(self, factor: float = 1.0) -> None:
+        # Fold the weight (and a pending decay factor) into the stored counts
+        scale = factor / self._weight
+        self.counts = {k: v * scale for k, v in self.counts.items() if v * scale > 0}
+        self.rows *= scale
+        self._weight = 1.0
+
+    def resize(self, n: int) -> None:
+        old = max(self.n, 1)
+        self.counts = {(k // old) * n + k % old: v for k, v in self.counts.items()}
+        self._events = deque(
+            (t, (k // old) * n + k % old, i, w) for t, k, i, w in self._events
+        )
+        self.rows = np.concatenate((self.rows, np.zeros(n - self.n)))
+        self.n = n
+
+    def prob(self, i: int, j: int) -> float:
+        count = self.counts.get(i * self.n + j, 0.0)
+        return (count / self._weight + 1.0) / (self.rows[i] / self._weight + self.n)
+
+    def score(self, i: int, j: int) -> float:
+        return -math.log(self.prob(i, j))
+
+    def scores_at(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        get = self.counts.get
+        keys = (np.asarray(a) * self.n + np.asarray(b)).tolist()
+        counts = np.fromiter((get(k, 0.0) for k in keys), dtype=np.float64, count=len(keys))
+        w = self._weight
+        return -np.log((counts / w + 1.0) / (self.rows[a] / w + self.n))
+
+    def matrix(self) -> np.ndarray:
+        counts = np.zeros(self.n * self.n)
+        if self.counts:
+            counts[np.fromiter(self.counts, dtype=np.int64)] = list(self.counts.values())
+        smoothed = counts.reshape(self.n, self.n) / self._weight + 1.0
+        return smoothed / (self.rows / self._weight + self.n)[:, None]
+
+    def left_multiply(self, pi: np.ndarray) -> np.ndarray:
+        keys = np.fromiter(self.counts, dtype=np.int64, count=len(self.counts))
+        values = np.fromiter(self.counts.values(), dtype=np.float64, count=len(self.counts))
+        a, b = np.divmod(keys, max(self.n, 1))
+        scaled = pi / (self.rows / self._weight + self.n)
+        weights = scaled[a] * values / self._weight
+        return np.bincount(b, weights=weights, minlength=self.n) + scaled.sum()
 
 
 class MarkovChain:
@@ -18,46 +323,438 @@ class MarkovChain:
     Parameters
     ----------
     states:
-        Iterable of all possible state labels.  The order is preserved and used
-        to build the transition matrix.
+        Iterable of all possible states.  Any hashable works; integer codes
+        from :func:`features.message_state_code` are cheapest.  The order is
+        preserved and used to build the transition matrix.
+    backend:
+        ``"dense"``, ``"sparse"`` or ``"auto"`` (sparse above
+        ``DENSE_LIMIT`` states).  Both give identical probabilities.
+    decay:
+        Forget exponentially: each count is multiplied by ``decay`` per
+        time unit (per transition, or per second with timestamps).
+    window:
+        Only count transitions from the last ``window`` time units.
+
+    ``decay`` and ``window`` select the forgetting backend and are mutually
+    exclusive.
     """
 
-    def __init__(self, states: Iterable[str]):
-        self.states: List[str] = list(states)
-        # Count transitions from state i to j
-        self._counts = {s: defaultdict(int) for s in self.states}
-        # Probabilities P(j|i); start with Laplace smoothing (1 everywhere)
-        self._probs = {s: {t: 1.0 for t in self.states} for s in self.states}
+    DENSE_LIMIT = 1024
+    K_STEP_CACHE = 32
+    K_STEP_ROWS = 1024
+    REFRESH_EVERY = 256
+
+    def __init__(
+        self,
+        states: Iterable[Hashable],
+        backend: str = "auto",
+        decay: float | None = None,
+        window: float | None = None,
+    ):
+        self.states: List[Hashable] = list(states)
+        self._index: Dict[Hashable, int] = {s: i for i, s in enumerate(self.states)}
+        if decay is not None or window is not None:
+            if backend not in ("auto", "forgetting"):
+                raise ValueError("decay and window need the forgetting backend")
+            backend = "forgetting"
+        elif backend == "auto":
+            backend = "dense" if len(self.states) <= self.DENSE_LIMIT else "sparse"
+        if backend == "forgetting":
+            self._table = _ForgettingTransitions(len(self.states), decay, window)
+        elif backend == "dense":
+            self._table = _DenseTransitions(len(self.states))
+        elif backend == "sparse":
+            self._table = _SparseTransitions(len(self.states))
+        else:
+            raise ValueError(f"Unknown backend: {backend!r}")
+        self.backend = backend
+        # Last state index seen by partial_fit, carried into the next call
+        self._last: int | None = None
+        # Derived quantities, dropped whenever the counts change
+        self._derived: Dict[Any, Any] = {}
+        self._powers: OrderedDict[int, np.ndarray] = OrderedDict()
+        self._rows: OrderedDict[Tuple[int, int], np.ndarray] = OrderedDict()
+        # Deferred observe() calls since the derived caches were dropped
+        self._deferred = 0
+
+    def _invalidate(self) -> None:
+        self._deferred = 0
+        if self._derived or self._powers or self._rows:
+            self._derived.clear()
+            self._powers.clear()
+            self._rows.clear()
+
+    def __contains__(self, state: Hashable) -> bool:
+        return state in self._index
 
-    def fit(self, sequence: Iterable[str]) -> None:
+    def encode(self, sequence: Iterable[Hashable], strict: bool = True) -> np.ndarray:
+        """Map ``sequence`` to state indices.
+
+        Unknown states raise ``KeyError``, or map to ``-1`` when ``strict``
+        is false.
+        """
+        index = self._index
+        if strict:
+            codes = [index[s] for s in sequence]
+        else:
+            codes = [index.get(s, -1) for s in sequence]
+        return np.asarray(codes, dtype=np.int64)
+
+    def add_states(self, states: Iterable[Hashable]) -> None:
+        """Extend the state space with ``states`` not already present.
+
+        Counts are kept; since Laplace smoothing depends on the number of
+        states, all rows are renormalised on next access.
+        """
+        new = [s for s in dict.fromkeys(states) if s not in self._index]
+        if not new:
+            return
+        for s in new:
+            self._index[s] = len(self.states)
+            self.states.append(s)
+        self._table.resize(len(self.states))
+        self._invalidate()
+
+    def fit(self, sequence: Iterable[Hashable]) -> None:
         """Estimate transition probabilities from a sequence of states."""
-        seq = list(sequence)
-        for a, b in zip(seq[:-1], seq[1:]):
-            if a in self._counts and b in self._counts:
-                self._counts[a][b] += 1
-        # Convert counts to probabilities with Laplace smoothing
-        for a in self.states:
-            total = sum(self._counts[a][b] + 1 for b in self.states)
-            self._probs[a] = {
-                b: (self._counts[a][b] + 1) / total for b in self.states
-            }
-
-    def transition_prob(self, a: str, b: str) -> float:
+        self._add_sequence(self.encode(sequence, strict=False))
+
+    def partial_fit(
+        self, sequence: Iterable[Hashable], timestamps: Iterable[float] | None = None
+    ) -> None:
+        """Add the transitions of ``sequence`` to the model incrementally.
+
+        The last state of the previous ``partial_fit`` call is carried over,
+        so a long stream can be fed in pieces without losing the transitions
+        across piece boundaries.  Only the rows that received transitions are
+        renormalised, and only when next accessed.  ``timestamps`` (one per
+        state) drive the clock of the ``decay``/``window`` modes.
+        """
+        codes = self.encode(sequence, strict=False)
+        if not len(codes):
+            return
+        times = None if timestamps is None else np.asarray(list(timestamps), dtype=np.float64)
+        if self._last is not None:
+            codes = np.concatenate(([self._last], codes))
+        elif times is not None:
+            times = times[1:]
+        self._last = int(codes[-1])
+        self._add_sequence(codes, times)
+
+    def _add_sequence(self, codes: np.ndarray, times: np.ndarray | None = None) -> None:
+        a, b = codes[:-1], codes[1:]
+        known = (a >= 0) & (b >= 0)
+        if times is not None:
+            times = times[known]
+        self._add(a[known], b[known], times=times)
+
+    def _add(
+        self,
+        a: np.ndarray,
+        b: np.ndarray,
+        weights: np.ndarray | None = None,
+        times: np.ndarray | None = None,
+    ) -> None:
+        self._invalidate()
+        if self.backend == "forgetting":
+            self._table.add(a, b, weights, times)
+        else:
+            self._table.add(a, b, weights)
+
+    def add_transitions(
+        self,
+        pairs: Iterable[Tuple[Hashable, Hashable]],
+        timestamps: Iterable[float] | None = None,
+    ) -> None:
+        """Add individual ``(a, b)`` transitions in order.
+
+        Pairs with unknown states are skipped.  ``timestamps`` (one per pair)
+        drive the clock of the ``decay``/``window`` modes.
+        """
+        index = self._index
+        pairs = list(pairs)
+        a = np.asarray([index.get(p[0], -1) for p in pairs], dtype=np.int64)
+        b = np.asarray([index.get(p[1], -1) for p in pairs], dtype=np.int64)
+        known = (a >= 0) & (b >= 0)
+        times = None
+        if timestamps is not None:
+            times = np.asarray(list(timestamps), dtype=np.float64)[known]
+        self._add(a[known], b[known], times=times)
+
+    def observe(
+        self, a: Hashable, b: Hashable, timestamp: float | None = None, defer: bool = False
+    ) -> None:
+        """Add a single ``a -> b`` transition; O(1) for the forgetting backend.
+
+        Transition probabilities are always current.  With ``defer`` the
+        cached long-run results (``k``-step matrices, stationary distribution)
+        are only dropped every ``REFRESH_EVERY`` deferred observations, so
+        online learning does not defeat the caches.
+        """
+        i, j = self._index[a], self._index[b]
+        if not defer:
+            self._invalidate()
+        else:
+            self._deferred += 1
+            if self._deferred >= self.REFRESH_EVERY:
+                self._invalidate()
+        if self.backend == "forgetting":
+            self._table.observe(i, j, 1.0, timestamp)
+        else:
+            self._table.add(np.array([i]), np.array([j]))
+
+    def fit_counts(self, counts: Mapping[Tuple[Hashable, Hashable], int]) -> None:
+        """Estimate transition probabilities from pre-aggregated counts.
+
+        ``counts`` maps ``(a, b)`` pairs to the number of observed ``a -> b``
+        transitions.  This allows training on streams that are too large to
+        hold as a single sequence.
+        """
+        index = self._index
+        pairs = [
+            (index[a], index[b], n)
+            for (a, b), n in counts.items()
+            if a in index and b in index
+        ]
+        if pairs:
+            a, b, n = np.asarray(pairs, dtype=np.int64).T
+            # Aggregated counts carry no ordering, so they share one instant
+            times = None
+            if self.backend == "forgetting":
+                clock = self._table.clock
+                times = np.full(len(a), 0.0 if clock is None else clock)
+            self._add(a, b, n, times)
+
+    def transition_prob(self, a: Hashable, b: Hashable) -> float:
         """Return probability of transitioning from ``a`` to ``b``."""
-        return self._probs[a][b]
+        return self._table.prob(self._index[a], self._index[b])
+
+    def transition_matrix(self) -> np.ndarray:
+        """Smoothed transition probabilities as an ``S x S`` array.
+
+        With the sparse backend the matrix is materialised on each call.
+        """
+        return self._table.matrix()
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the transition tables."""
+        return self._table.nbytes
 
-    def sequence_loglik(self, sequence: Iterable[str]) -> float:
+    # Long-run behaviour; results are cached until the counts change
+
+    def stationary_distribution(self, tol: float = 1e-12, max_iter: int = 100_000) -> np.ndarray:
+        """Stationary distribution ``pi = pi P`` by power iteration.
+
+        Laplace smoothing makes every transition possible, so the chain is
+        ergodic and ``pi`` unique.  Iteration stops once successive
+        estimates differ by less than ``tol`` in L1 norm.  The sparse and
+        forgetting backends iterate without materialising ``P``.
+        """
+        pi = self._derived.get("stationary")
+        if pi is not None:
+            return pi
+        n = len(self.states)
+        pi = np.full(n, 1.0 / n) if n else np.empty(0)
+        for _ in range(max_iter if n else 0):
+            nxt = self._table.left_multiply(pi)
+            nxt /= nxt.sum()
+            done = np.abs(nxt - pi).sum() < tol
+            pi = nxt
+            if done:
+                break
+        pi.setflags(write=False)
+        self._derived["stationary"] = pi
+        return pi
+
+    def _square(self, i: int) -> np.ndarray:
+        # P ** (2 ** i), built by repeated squaring and kept until refit
+        squares = self._derived.setdefault("squares", [])
+        if not squares:
+            squares.append(np.array(self.transition_matrix()))
+        while len(squares) <= i:
+            squares.append(squares[-1] @ squares[-1])
+        return squares[i]
+
+    def _power(self, k: int) -> np.ndarray:
+        result = None
+        i = 0
+        while k:
+            if k & 1:
+                square = self._square(i)
+                result = square if result is None else result @ square
+            k >>= 1
+            i += 1
+        if result is None:
+            return np.eye(len(self.states))
+        return result
+
+    def k_step(self, k: int) -> np.ndarray:
+        """``k``-step transition matrix ``P**k`` (``S x S``, read-only).
+
+        Computed by exponentiation by squaring and kept in an LRU cache of
+        ``K_STEP_CACHE`` entries keyed by ``k``.
+        """
+        if k < 0:
+            raise ValueError("k must be non-negative")
+        cached = self._powers.get(k)
+        if cached is not None:
+            self._powers.move_to_end(k)
+            return cached
+        result = self._power(k)
+        result.setflags(write=False)
+        self._powers[k] = result
+        if len(self._powers) > self.K_STEP_CACHE:
+            self._powers.popitem(last=False)
+        return result
+
+    def _distance(self, k: int) -> float:
+        # Worst-case total variation distance from stationarity after k steps
+        pi = self.stationary_distribution()
+        return 0.5 * float(np.abs(self._power(k) - pi).sum(axis=1).max())
+
+    def mixing_time(self, eps: float = 0.25, max_steps: int = 1 << 20) -> int | None:
+        """Smallest ``t`` with ``max_i TV(P**t[i], pi) <= eps``.
+
+        Doubles ``t`` until the distance drops below ``eps`` and then
+        bisects, so it costs ``O(log t)`` matrix products per probe.
+        Returns ``None`` if the chain has not mixed after ``max_steps``.
+        """
+        key = ("mixing", eps)
+        if key in self._derived:
+            return self._derived[key]
+        result: int | None = None
+        if not self.states or self._distance(0) <= eps:
+            result = 0
+        else:
+            hi = 1
+            while hi <= max_steps and self._distance(hi) > eps:
+                hi *= 2
+            if hi <= max_steps or self._distance(max_steps) <= eps:
+                hi = min(hi, max_steps)
+                lo = hi // 2
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if self._distance(mid) <= eps:
+                        hi = mid
+                    else:
+                        lo = mid
+                result = hi
+        self._derived[key] = result
+        return result
+
+    def spectral_gap(self) -> float:
+        """``1 - |lambda_2|``, the gap below the largest eigenvalue of ``P``.
+
+        Its inverse, the relaxation time, sets the rate of convergence to
+        the stationary distribution.
+        """
+        gap = self._derived.get("gap")
+        if gap is None:
+            moduli = np.sort(np.abs(np.linalg.eigvals(self.transition_matrix())))
+            gap = 1.0 - float(moduli[-2]) if len(moduli) > 1 else 1.0
+            self._derived["gap"] = gap
+        return gap
+
+    def transition_score(self, a: Hashable, b: Hashable) -> float:
+        """Return the anomaly score ``-log P(b|a)`` of one transition."""
+        return self._table.score(self._index[a], self._index[b])
+
+    def _k_step_row(self, i: int, k: int) -> np.ndarray:
+        # Row i of P**k by repeated pi @ P, resuming from the longest cached
+        # row of state i; memory and time scale with the observed counts
+        rows = self._rows
+        row = rows.get((i, k))
+        if row is not None:
+            rows.move_to_end((i, k))
+            return row
+        start = next((j for j in range(k - 1, 0, -1) if (i, j) in rows), 0)
+        if start:
+            row = rows[(i, start)]
+        else:
+            row = np.zeros(len(self.states))
+            row[i] = 1.0
+        for _ in range(k - start):
+            row = self._table.left_multiply(row)
+        rows[(i, k)] = row
+        if len(rows) > self.K_STEP_ROWS:
+            rows.popitem(last=False)
+        return row
+
+    def k_step_score(self, a: Hashable, b: Hashable, k: int) -> float:
+        """Score ``-log P**k(b|a)`` of reaching ``b`` from ``a`` in ``k`` steps.
+
+        ``k == 1`` is :meth:`transition_score`.  The dense backend looks the
+        probability up in the :meth:`k_step` cache; the sparse and forgetting
+        backends only compute (and cache) row ``a`` of ``P**k``, since a dense
+        ``S x S`` power would defeat their purpose.
+        """
+        if k == 1:
+            return self.transition_score(a, b)
+        i, j = self._index[a], self._index[b]
+        if self.backend == "dense":
+            return -math.log(self.k_step(k)[i, j])
+        return -math.log(self._k_step_row(i, k)[j])
+
+    def sequence_loglik(self, sequence: Iterable[Hashable]) -> float:
         """Log-likelihood of a sequence under the model."""
-        seq = list(sequence)
-        loglik = 0.0
-        for a, b in zip(seq[:-1], seq[1:]):
-            loglik += math.log(self.transition_prob(a, b))
-        return loglik
+        codes = self.encode(sequence)
+        return -float(self._table.scores_at(codes[:-1], codes[1:]).sum())
 
-    def anomaly_scores(self, sequence: Iterable[str]) -> List[float]:
+    def anomaly_scores(self, sequence: Iterable[Hashable]) -> List[float]:
         """Negative log-probability for each transition in ``sequence``."""
-        seq = list(sequence)
-        scores = []
-        for a, b in zip(seq[:-1], seq[1:]):
-            scores.append(-math.log(self.transition_prob(a, b)))
-        return scores
+        return self.score_encoded(self.encode(sequence)).tolist()
+
+    # Batch scoring on encoded sequences
+
+    def encode_many(
+        self, sequences: Iterable[Iterable[Hashable]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode several sequences into one ragged batch.
+
+        Returns ``(codes, offsets)`` where sequence ``i`` is
+        ``codes[offsets[i]:offsets[i + 1]]``.
+        """
+        parts = [self.encode(seq) for seq in sequences]
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in parts], out=offsets[1:])
+        codes = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        return codes, offsets
+
+    def _check(self, codes: np.ndarray) -> np.ndarray:
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(codes) and (codes.min() < 0 or codes.max() >= len(self.states)):
+            raise ValueError("state index out of range")
+        return codes
+
+    def score_encoded(self, codes: np.ndarray) -> np.ndarray:
+        """Anomaly scores of the transitions in an encoded sequence."""
+        codes = self._check(codes)
+        return self._table.scores_at(codes[:-1], codes[1:])
+
+    def score_ragged(self, codes: np.ndarray, offsets: Sequence[int]) -> np.ndarray:
+        """Anomaly scores of every transition in a ragged batch.
+
+        ``codes`` and ``offsets`` are as returned by :meth:`encode_many`.
+        All sequences are scored with a single gather; pairs spanning two
+        sequences are skipped, so the result holds ``max(len(seq) - 1, 0)``
+        consecutive scores per sequence, in order.
+        """
+        codes = self._check(codes)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        keep = np.ones(max(len(codes) - 1, 0), dtype=bool)
+        starts = offsets[1:-1]
+        keep[starts[(starts > 0) & (starts < len(codes))] - 1] = False
+        return self._table.scores_at(codes[:-1][keep], codes[1:][keep])
+
+    def loglik_ragged(self, codes: np.ndarray, offsets: Sequence[int]) -> np.ndarray:
+        """Log-likelihood of each sequence in a ragged batch."""
+        offsets = np.asarray(offsets, dtype=np.int64)
+        scores = self.score_ragged(codes, offsets)
+        lengths = np.maximum(np.diff(offsets) - 1, 0)
+        if not len(lengths):
+            return np.empty(0)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        # reduceat yields the first element for empty segments; mask those
+        totals = np.add.reduceat(np.append(scores, 0.0), starts)
+        return np.where(lengths > 0, -totals, 0.0)
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+"""Columnar parser for NMEA 0183 ``GGA`` / ``GSA`` / ``RMC`` sentences.
+
+The research scripts under ``Markov_*/new article`` read whole capture files
+with ``readlines`` and then rescan every line once per time bucket.  This
+module parses a capture once, in blocks of raw bytes, into a
+:class:`SentenceBatch` of NumPy columns.  Line splitting, checksum
+validation and sentence classification are vectorised per block; only the
+comma-separated payload of ``GGA`` and ``RMC`` sentences is split in Python.
+"""
+
+from dataclasses import dataclass
+import os
+from typing import IO, Iterable, Iterator, List, Sequence, Union
+
+import numpy as np
+
+from .parser import open_log
+
+SENTENCES = ("GGA", "GSA", "RMC")
+SENTENCE_GGA, SENTENCE_GSA, SENTENCE_RMC = range(len(SENTENCES))
+
+_BLOCK_SIZE = 1 << 20
+_CODES = np.array(
+    [(ord(s[0]) << 16) | (ord(s[1]) << 8) | ord(s[2]) for s in SENTENCES],
+    dtype=np.int64,
+)
+_HEX = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX[_c] = _i
+for _i, _c in enumerate(b"abcdef"):
+    _HEX[_c] = 10 + _i
+
+SentenceSource = Union[str, "os.PathLike[str]", IO, Iterable[Union[str, bytes]]]
+
+
+@dataclass
+class SentenceBatch:
+    """Column arrays describing one parsed sentence per row.
+
+    ``sentence`` indexes :data:`SENTENCES`.  ``time`` is seconds since
+    midnight decoded from ``hhmmss.sss``; ``time_field`` is the same field as
+    the plain number written in the sentence, which the synthetic research
+    captures use as a sub-second counter.  Positions are signed decimal
+    degrees, ``speed`` is in knots and ``course`` in degrees.  Fields a
+    sentence does not carry are NaN.  ``valid`` flags rows whose checksum
+    matched; ``dropped`` counts lines that were discarded.
+    """
+
+    sentence: np.ndarray
+    time: np.ndarray
+    time_field: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    speed: np.ndarray
+    course: np.ndarray
+    valid: np.ndarray
+    dropped: int = 0
+
+    _COLUMNS = ("sentence", "time", "time_field", "lat", "lon", "speed", "course", "valid")
+
+    def __len__(self) -> int:
+        return len(self.sentence)
+
+    def __getitem__(self, index: Union[slice, np.ndarray]) -> "SentenceBatch":
+        """Select rows by slice, index array or boolean mask."""
+        return SentenceBatch(
+            *(getattr(self, name)[index] for name in self._COLUMNS), dropped=self.dropped
+        )
+
+    def of_type(self, *names: str) -> "SentenceBatch":
+        """Rows whose sentence type is one of ``names`` (e.g. ``"GGA"``)."""
+        codes = [SENTENCES.index(name) for name in names]
+        return self[np.isin(self.sentence, codes)]
+
+    @classmethod
+    def concat(cls, batches: Sequence["SentenceBatch"]) -> "SentenceBatch":
+        if not batches:
+            return _parse_block(b"\n", True)
+        return cls(
+            *(np.concatenate([getattr(b, name) for b in batches]) for name in cls._COLUMNS),
+            dropped=sum(b.dropped for b in batches),
+        )
+
+
+def _to_float(text: bytes) -> float:
+    return float(text) if text else np.nan
+
+
+def _degrees(raw: np.ndarray, negative: np.ndarray) -> np.ndarray:
+    # NMEA positions are ``dddmm.mmmm``
+    whole = np.floor(raw / 100.0)
+    deg = whole + (raw - whole * 100.0) / 60.0
+    return np.where(negative, -deg, deg)
+
+
+def _parse_block(buf: bytes, drop_invalid: bool) -> SentenceBatch:
+    """Parse ``buf``, which must consist of complete ``\\n``-terminated lines."""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    ends = np.flatnonzero(data == 10)
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    ends = ends - ((ends > starts) & (data[ends - 1] == 13))  # strip "\r"
+    nonempty = ends > starts
+
+    # Checksum: XOR of the bytes between "$" and "*", via a prefix XOR
+    acc = np.bitwise_xor.accumulate(data)
+    stars = np.flatnonzero(data == 42)
+    last_star = np.searchsorted(stars, ends) - 1
+    if len(stars):
+        star = np.where(last_star >= 0, stars[np.maximum(last_star, 0)], -1)
+    else:
+        star = np.full(len(ends), -1)
+    framed = nonempty & (data[starts] == 36) & (star > starts) & (star + 3 <= ends)
+    star_c = np.where(framed, star, starts + 1)
+    computed = acc[star_c - 1] ^ acc[starts]
+    hi = _HEX[data[np.minimum(star_c + 1, len(data) - 1)]]
+    lo = _HEX[data[np.minimum(star_c + 2, len(data) - 1)]]
+    valid = framed & (hi < 16) & (lo < 16) & ((hi.astype(np.int64) << 4 | lo) == computed)
+
+    # Sentence type from the three characters after the talker id ("$GP")
+    typed = np.flatnonzero(framed & (star_c >= starts + 6))
+    pos = starts[typed] + 3
+    code = (
+        data[pos].astype(np.int64) << 16
+        | data[pos + 1].astype(np.int64) << 8
+        | data[pos + 2].astype(np.int64)
+    )
+    sentence = np.full(len(starts), -1, dtype=np.int8)
+    for i, c in enumerate(_CODES.tolist()):
+        sentence[typed[code == c]] = i
+
+    keep = (sentence >= 0) & (valid | (not drop_invalid))
+    rows = np.flatnonzero(keep)
+    n = len(rows)
+    time_field = np.full(n, np.nan)
+    lat = np.full(n, np.nan)
+    lon = np.full(n, np.nan)
+    speed = np.full(n, np.nan)
+    course = np.full(n, np.nan)
+    south = np.zeros(n, dtype=bool)
+    west = np.zeros(n, dtype=bool)
+
+    kinds = sentence[rows]
+    payload_rows = np.flatnonzero(kinds != SENTENCE_GSA)
+    for j, s, e, kind in zip(
+        payload_rows.tolist(),
+        starts[rows[payload_rows]].tolist(),
+        star_c[rows[payload_rows]].tolist(),
+        kinds[payload_rows].tolist(),
+    ):
+        f = buf[s:e].split(b",")
+        try:
+            if kind == SENTENCE_GGA:
+                time_field[j] = _to_float(f[1])
+                lat[j] = _to_float(f[2])
+                south[j] = f[3] == b"S"
+                lon[j] = _to_float(f[4])
+                west[j] = f[5] == b"W"
+            else:
+                time_field[j] = _to_float(f[1])
+                lat[j] = _to_float(f[3])
+                south[j] = f[4] == b"S"
+                lon[j] = _to_float(f[5])
+                west[j] = f[6] == b"W"
+                speed[j] = _to_float(f[7])
+                course[j] = _to_float(f[8])
+        except (IndexError, ValueError):
+            # Truncated or garbled payload: keep what was parsed
+            pass
+
+    hhmm = np.floor(time_field / 100.0)
+    time = np.floor(hhmm / 100.0) * 3600.0 + (hhmm % 100.0) * 60.0 + (time_field - hhmm * 100.0)
+    return SentenceBatch(
+        sentence=kinds,
+        time=time,
+        time_field=time_field,
+        lat=_degrees(lat, south),
+        lon=_degrees(lon, west),
+        speed=speed,
+        course=course,
+        valid=valid[rows],
+        dropped=int(np.count_nonzero(nonempty)) - n,
+    )
+
+
+def _iter_buffers(source: SentenceSource, block_size: int) -> Iterator[bytes]:
+    """Yield blocks of complete lines from any supported source."""
+    if isinstance(source, (str, os.PathLike)):
+        with open_log(source, binary=True) as fh:
+            yield from _iter_buffers(fh, block_size)
+        return
+    if hasattr(source, "read"):
+        chunks: Iterable[Union[str, bytes]] = iter(lambda: source.read(block_size), source.read(0))
+        sep = ""
+    else:
+        chunks = source
+        sep = "\n"
+    pending = b""
+    parts: List[bytes] = []
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        parts.append(chunk)
+        if sep:
+            parts.append(b"\n")
+        size += len(chunk)
+        if size >= block_size:
+            buf = pending + b"".join(parts)
+            cut = buf.rfind(b"\n") + 1
+            if cut:
+                yield buf[:cut]
+            pending = buf[cut:]
+            parts = []
+            size = 0
+    buf = pending + b"".join(parts)
+    if buf:
+        yield buf if buf.endswith(b"\n") else buf + b"\n"
+
+
+def iter_batches(
+    source: SentenceSource, drop_invalid: bool = True, block_size: int = _BLOCK_SIZE
+) -> Iterator[SentenceBatch]:
+    """Stream ``source`` as one :class:`SentenceBatch` per block of lines.
+
+    ``source`` may be a path (optionally compressed), a binary or text file
+    object, or an iterable of lines.  Lines with a wrong or missing checksum
+    are discarded unless ``drop_invalid`` is false, in which case they are
+    kept with ``valid`` set to ``False``.
+    """
+
+    for buf in _iter_buffers(source, block_size):
+        yield _parse_block(buf, drop_invalid)
+
+
+def parse_sentences(
+    source: SentenceSource, drop_invalid: bool = True, block_size: int = _BLOCK_SIZE
+) -> SentenceBatch:
+    """Parse a whole capture into a single :class:`SentenceBatch`."""
+
+    return SentenceBatch.concat(list(iter_batches(source, drop_invalid, block_size)))
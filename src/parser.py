@@ -8,13 +8,28 @@ throughout the proof of concept is intentionally simple:
 
     timestamp,pgn,field1=value1;field2=value2
 
-Timestamps are in ISO-8601 format.  Field values are parsed as ``float`` and
-stored in the :attr:`Message.fields` mapping.
+Timestamps are in ISO-8601 format (plain epoch seconds are also accepted).
+Field values are parsed as ``float`` and stored in the :attr:`Message.fields`
+mapping.
 """
 
+from array import array
+import bz2
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Iterable, List
+import gzip
+import hashlib
+import heapq
+import io
+import lzma
+import mmap
+import os
+from typing import IO, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+LogSource = Union[str, "os.PathLike[str]", IO[str], Iterable[str]]
 
 
 @dataclass
@@ -26,6 +41,185 @@ class Message:
     fields: Dict[str, float]
 
 
+@dataclass
+class MessageBatch:
+    """Columnar representation of many :class:`Message` objects.
+
+    Row ``i`` describes one message: ``timestamps[i]`` (float64 seconds since
+    the UNIX epoch), ``pgns[i]`` (int32) and ``columns[name][i]`` (float64)
+    for every field name in the vocabulary.  Fields a message does not carry
+    are stored as NaN, so a NaN value is indistinguishable from a missing
+    field.  A million messages over the five fields of the proof of concept
+    take about 52 MB, compared with several hundred bytes per
+    :class:`Message` object.
+    """
+
+    timestamps: np.ndarray
+    pgns: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def field_names(self) -> List[str]:
+        """Field-name vocabulary, in column order."""
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the underlying arrays in bytes."""
+        return (
+            self.timestamps.nbytes
+            + self.pgns.nbytes
+            + sum(col.nbytes for col in self.columns.values())
+        )
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Message]) -> "MessageBatch":
+        """Build a batch from any iterable of messages in a single pass."""
+        timestamps = array("d")
+        pgns = array("i")
+        columns: Dict[str, array] = {}
+        n = 0
+        for msg in messages:
+            timestamps.append(msg.timestamp)
+            pgns.append(msg.pgn)
+            fields = msg.fields
+            for key, col in columns.items():
+                col.append(fields.get(key, _NAN))
+            if not fields.keys() <= columns.keys():
+                for key, value in fields.items():
+                    if key not in columns:
+                        col = columns[key] = array("d", [_NAN]) * n
+                        col.append(value)
+            n += 1
+        return cls(
+            timestamps=_as_numpy(timestamps, np.float64),
+            pgns=_as_numpy(pgns, np.int32),
+            columns={k: _as_numpy(v, np.float64) for k, v in columns.items()},
+        )
+
+    def to_messages(self) -> List[Message]:
+        """Materialise every row as a :class:`Message`."""
+        return list(self)
+
+    def __iter__(self) -> Iterator[Message]:
+        # Convert in blocks so iterating a large batch stays cheap in memory
+        block = 4096
+        for start in range(0, len(self), block):
+            stop = start + block
+            timestamps = self.timestamps[start:stop].tolist()
+            pgns = self.pgns[start:stop].tolist()
+            columns = [(k, v[start:stop].tolist()) for k, v in self.columns.items()]
+            for i, (ts, pgn) in enumerate(zip(timestamps, pgns)):
+                fields = {k: col[i] for k, col in columns if col[i] == col[i]}
+                yield Message(timestamp=ts, pgn=pgn, fields=fields)
+
+    @classmethod
+    def concat(cls, batches: Sequence["MessageBatch"]) -> "MessageBatch":
+        """Concatenate ``batches`` row-wise, merging their field vocabularies."""
+        if not batches:
+            return cls.from_messages([])
+        names: Dict[str, None] = {}
+        for batch in batches:
+            names.update(dict.fromkeys(batch.columns))
+        columns = {
+            name: np.concatenate(
+                [
+                    b.columns[name] if name in b.columns else np.full(len(b), np.nan)
+                    for b in batches
+                ]
+            )
+            for name in names
+        }
+        return cls(
+            timestamps=np.concatenate([b.timestamps for b in batches]),
+            pgns=np.concatenate([b.pgns for b in batches]),
+            columns=columns,
+        )
+
+    def __getitem__(self, index: Union[slice, np.ndarray]) -> "MessageBatch":
+        """Select rows by slice, integer index array or boolean mask."""
+        return MessageBatch(
+            timestamps=self.timestamps[index],
+            pgns=self.pgns[index],
+            columns={k: v[index] for k, v in self.columns.items()},
+        )
+
+    def sorted(self) -> "MessageBatch":
+        """Return the batch ordered by timestamp (stable for equal times)."""
+        if np.all(self.timestamps[1:] >= self.timestamps[:-1]):
+            return self
+        return self[np.argsort(self.timestamps, kind="stable")]
+
+    def iter_steps(self) -> Iterator[Dict[int, Message]]:
+        """Yield timestamp-grouped steps like :func:`group_by_timestamp`."""
+        return iter_steps(self.sorted())
+
+
+_NAN = float("nan")
+
+
+def _as_numpy(values: array, dtype: type) -> np.ndarray:
+    # Zero-copy view of the growable buffer used while building a batch
+    if not values:
+        return np.empty(0, dtype=dtype)
+    return np.frombuffer(values, dtype=dtype)
+
+
+class TimestampDecoder:
+    """ISO-8601 to UNIX epoch decoder exploiting repeated log timestamps.
+
+    All messages observed in one step are written with the same timestamp,
+    so consecutive lines very often carry an identical timestamp string.
+    :meth:`decode` remembers the last string it decoded and returns the
+    cached epoch for repeats, which costs a single string comparison.  New
+    strings are decoded with :meth:`datetime.fromisoformat` (naive
+    timestamps are interpreted in local time, ``Z`` suffixes as UTC).
+    Strings that are not ISO-8601 but plain numbers are accepted as epoch
+    seconds, as written by ``candump -l`` style loggers.  Once a log has
+    shown epoch seconds, numbers are recognised before ``fromisoformat`` is
+    tried, so such logs do not pay for a failed ISO parse on every line.
+    """
+
+    def __init__(self) -> None:
+        # Replaced atomically so a shared decoder is safe across threads.
+        self._last: tuple[str | None, float] = (None, 0.0)
+        # Whether the last new string was epoch seconds
+        self._epoch = False
+
+    def decode(self, text: str) -> float:
+        """Return seconds since the UNIX epoch for timestamp ``text``."""
+
+        last = self._last
+        if text == last[0]:
+            return last[1]
+        if self._epoch and text.replace(".", "", 1).isdigit():
+            value = float(text)
+        else:
+            try:
+                value = datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+                self._epoch = False
+            except ValueError:
+                value = self._fallback(text)
+                self._epoch = True
+        self._last = (text, value)
+        return value
+
+    __call__ = decode
+
+    @staticmethod
+    def _fallback(text: str) -> float:
+        if text.replace(".", "", 1).isdigit():
+            return float(text)
+        raise ValueError(f"Invalid timestamp: {text!r}")
+
+
+parse_timestamp = TimestampDecoder().decode
+"""Shared :meth:`TimestampDecoder.decode` used by :func:`parse_line`."""
+
+
 def parse_line(line: str) -> Message:
     """Parse a single log ``line`` into a :class:`Message`.
 
@@ -36,7 +230,7 @@ def parse_line(line: str) -> Message:
     """
 
     ts_str, pgn_str, data_str = line.strip().split(",", 2)
-    ts = datetime.fromisoformat(ts_str.replace("Z", "+00:00")).timestamp()
+    ts = parse_timestamp(ts_str)
     pgn = int(pgn_str)
     fields: Dict[str, float] = {}
     if data_str:
@@ -48,36 +242,363 @@ def parse_line(line: str) -> Message:
     return Message(timestamp=ts, pgn=pgn, fields=fields)
 
 
-def load_messages(path: str) -> List[Message]:
-    """Read a log file and return a list of :class:`Message` objects."""
+def _iter_lines(lines: Iterable[str]) -> Iterator[Message]:
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        yield parse_line(line)
 
-    messages: List[Message] = []
-    with open(path) as fh:
-        for line in fh:
-            line = line.strip()
-            if not line or line.startswith("#"):
+
+_EXTENSIONS = {".gz": "gzip", ".gzip": "gzip", ".bz2": "bz2", ".xz": "xz", ".lzma": "xz"}
+_MAGIC = ((b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"))
+_OPENERS = {"gzip": gzip.GzipFile, "bz2": bz2.BZ2File, "xz": lzma.LZMAFile}
+
+
+def compression(path: str) -> str | None:
+    """Return ``"gzip"``, ``"bz2"``, ``"xz"`` or ``None`` for ``path``.
+
+    The file extension is checked first, then the leading magic bytes.
+    """
+
+    kind = _EXTENSIONS.get(os.path.splitext(os.fspath(path))[1].lower())
+    if kind is not None:
+        return kind
+    with open(path, "rb") as fh:
+        head = fh.read(6)
+    for magic, kind in _MAGIC:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def open_log(path: str, buffer_size: int = 1 << 20, binary: bool = False) -> IO:
+    """Open a log for reading, decompressing gzip/bz2/xz on the fly.
+
+    Decompression streams through a ``buffer_size`` read buffer, so archived
+    captures never need to be unpacked to disk.  A text stream is returned
+    unless ``binary`` is true.
+    """
+
+    kind = compression(path)
+    if kind is None:
+        return open(path, "rb" if binary else "r", buffering=buffer_size)
+    stream = io.BufferedReader(_OPENERS[kind](path), buffer_size)
+    return stream if binary else io.TextIOWrapper(stream)
+
+
+def iter_messages(
+    source: LogSource,
+    start: float | None = None,
+    end: float | None = None,
+    index_dir: str | None = None,
+) -> Iterator[Message]:
+    """Lazily yield :class:`Message` objects from ``source``.
+
+    ``source`` may be a filesystem path, an open file-like object or any
+    iterable of lines.  Only one line is held in memory at a time, so
+    arbitrarily large captures can be processed with constant memory.  Note
+    that a plain ``str`` is always interpreted as a path; compressed paths
+    are decompressed transparently, see :func:`open_log`.
+
+    ``start`` and ``end`` restrict the output to ``start <= timestamp <
+    end``; the log is assumed to be in timestamp order.  For uncompressed
+    paths the sidecar index from :func:`load_index` is used to seek close to
+    ``start`` instead of parsing everything before it; ``index_dir`` keeps
+    that index out of the log's directory.
+    """
+
+    if start is None and end is None:
+        if isinstance(source, (str, os.PathLike)):
+            with open_log(source) as fh:
+                yield from _iter_lines(fh)
+        else:
+            yield from _iter_lines(source)
+        return
+
+    offset = 0
+    if isinstance(source, (str, os.PathLike)) and compression(source) is not None:
+        fh = open_log(source)
+        lines: Iterable[str] = fh
+    elif isinstance(source, (str, os.PathLike)):
+        if start is not None:
+            index = load_index(source, index_dir=index_dir)
+            entry = int(np.searchsorted(index["timestamp"], start, side="left")) - 1
+            if entry >= 0:
+                offset = int(index["offset"][entry])
+        fh = open(source, "rb")
+        fh.seek(offset)
+        lines = fh
+    else:
+        fh = None
+        lines = source
+    try:
+        for msg in _iter_lines(lines):
+            if start is not None and msg.timestamp < start:
                 continue
-            messages.append(parse_line(line))
-    return messages
+            if end is not None and msg.timestamp >= end:
+                break
+            yield msg
+    finally:
+        if fh is not None:
+            fh.close()
 
 
-def group_by_timestamp(messages: Iterable[Message]) -> List[Dict[int, Message]]:
-    """Group messages that share a timestamp.
+def load_messages(
+    path: LogSource,
+    start: float | None = None,
+    end: float | None = None,
+    index_dir: str | None = None,
+) -> List[Message]:
+    """Read a log file and return a list of :class:`Message` objects.
+
+    ``start`` / ``end`` select a time range, see :func:`iter_messages`.
+    """
 
-    Returns a list where each element is a mapping from PGN to the corresponding
-    :class:`Message` observed at that timestamp.
+    return list(iter_messages(path, start, end, index_dir))
+
+
+INDEX_SUFFIX = ".idx"
+_INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("offset", "<i8")])
+
+
+def index_path(path: str, index_dir: str | None = None) -> str:
+    """Location of the sidecar index for ``path``.
+
+    By default the index sits next to the log.  With ``index_dir`` it goes
+    there instead, named after the log and a hash of its absolute path so
+    logs with the same name in different directories do not collide.
+    """
+
+    path = os.fspath(path)
+    if index_dir is None:
+        return f"{path}{INDEX_SUFFIX}"
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+    return os.path.join(index_dir, f"{os.path.basename(path)}-{digest}{INDEX_SUFFIX}")
+
+
+def build_index(path: str, every: int = 1000, index_dir: str | None = None) -> np.ndarray:
+    """Build and save the sidecar time index for the text log at ``path``.
+
+    A single pass records the byte offset and timestamp of every ``every``-th
+    message line; only those lines have their timestamp decoded.  The
+    timestamps are a running maximum so the index stays sorted even if the
+    log is slightly out of order.  The index is saved at
+    :func:`index_path` and returned as a structured array with
+    ``timestamp`` and ``offset`` fields.  If it cannot be saved, e.g. on a
+    read-only archive, the in-memory index is still returned.
+    """
+
+    entries: List[Tuple[float, int]] = []
+    decode = TimestampDecoder().decode
+    newest = float("-inf")
+    offset = 0
+    count = 0
+    with open(path, "rb") as fh:
+        for line in fh:
+            stripped = line.strip()
+            if stripped and not stripped.startswith(b"#"):
+                if count % every == 0:
+                    newest = max(newest, decode(stripped.split(b",", 1)[0].decode()))
+                    entries.append((newest, offset))
+                count += 1
+            offset += len(line)
+    index = np.array(entries, dtype=_INDEX_DTYPE)
+    target = index_path(path, index_dir)
+    try:
+        if index_dir is not None:
+            os.makedirs(index_dir, exist_ok=True)
+        with open(target, "wb") as fh:
+            np.save(fh, index)
+    except OSError:
+        # Read-only location or full disk: drop any partial file
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+    return index
+
+
+def load_index(path: str, every: int = 1000, index_dir: str | None = None) -> np.ndarray:
+    """Return the sidecar index for ``path``, rebuilding it if missing or stale."""
+
+    target = index_path(path, index_dir)
+    try:
+        if os.path.getmtime(target) >= os.path.getmtime(path):
+            with open(target, "rb") as fh:
+                return np.load(fh)
+    except (OSError, ValueError):
+        pass
+    return build_index(path, every, index_dir)
+
+
+def load_batch(path: LogSource) -> MessageBatch:
+    """Read a log file straight into a columnar :class:`MessageBatch`."""
+
+    return MessageBatch.from_messages(iter_messages(path))
+
+
+def _split_ranges(path: str, chunk_size: int) -> List[Tuple[int, int]]:
+    """Split ``path`` into ``(start, end)`` byte ranges ending on newlines."""
+
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    ranges: List[Tuple[int, int]] = []
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = mm.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if end < 0 else end + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _parse_range(path: str, start: int, end: int) -> MessageBatch:
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+
+        def lines() -> Iterator[bytes]:
+            while mm.tell() < end:
+                yield mm.readline()
+
+        return MessageBatch.from_messages(_iter_lines(lines()))
+
+
+def load_batch_parallel(
+    path: str, workers: int | None = None, chunk_size: int = 64 * 1024 * 1024
+) -> MessageBatch:
+    """Parse a large log file into a :class:`MessageBatch` using many cores.
+
+    The file is memory-mapped and split into byte ranges of roughly
+    ``chunk_size`` bytes aligned to line boundaries.  Each range is parsed in
+    a separate process and shipped back as a compact batch; the results are
+    concatenated in file order.  ``workers`` defaults to the CPU count;
+    ``workers=1`` parses in the calling process.  Compressed files cannot be
+    split and are parsed as a single stream; see :func:`load_archives` for
+    parallelism across many archives.
+    """
+
+    if compression(path) is not None:
+        return load_batch(path)
+    ranges = _split_ranges(path, chunk_size)
+    if workers == 1 or len(ranges) <= 1:
+        batches = [_parse_range(path, start, end) for start, end in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_parse_range, path, start, end) for start, end in ranges]
+            batches = [f.result() for f in futures]
+    return MessageBatch.concat(batches)
+
+
+def load_archives(paths: Sequence[str], workers: int | None = None) -> MessageBatch:
+    """Decompress and parse many (possibly compressed) logs in parallel.
+
+    Each path is streamed through :func:`open_log` in its own worker
+    process, so cold-archive replays use every core for decompression as
+    well as parsing.  Batches are concatenated in the order of ``paths``.
+    """
+
+    if workers == 1 or len(paths) <= 1:
+        batches = [load_batch(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(load_batch, paths))
+    return MessageBatch.concat(batches)
+
+
+def iter_steps(messages: Iterable[Message]) -> Iterator[Dict[int, Message]]:
+    """Group consecutive messages sharing a timestamp without buffering.
+
+    Unlike :func:`group_by_timestamp` the input is not sorted; it is assumed
+    to already be in timestamp order, as is the case for recorded logs and
+    live feeds.  Each yielded step maps PGN to :class:`Message`.
     """
 
-    grouped: List[Dict[int, Message]] = []
     current_ts: float | None = None
     current: Dict[int, Message] = {}
-    for msg in sorted(messages, key=lambda m: m.timestamp):
+    for msg in messages:
         if current_ts is None or msg.timestamp != current_ts:
             if current:
-                grouped.append(current)
+                yield current
                 current = {}
             current_ts = msg.timestamp
         current[msg.pgn] = msg
     if current:
-        grouped.append(current)
-    return grouped
+        yield current
+
+
+class StreamGrouper:
+    """Group a slightly out-of-order message stream into timestamp steps.
+
+    Messages are held in a bounded reorder buffer keyed by timestamp.  The
+    watermark trails the newest timestamp seen by ``max_delay`` seconds;
+    once a buffered step is older than the watermark it is emitted and can
+    no longer change.  Messages arriving for a step that was already emitted
+    are dropped and counted in :attr:`dropped`.  If more than ``max_steps``
+    steps are pending, the oldest are emitted early to bound memory.
+
+    For in-order input each message costs O(1) amortised heap work, so
+    sorted and near-sorted logs are grouped in a single linear pass and
+    with ``max_delay=0`` the output matches :func:`iter_steps`.
+    """
+
+    def __init__(self, max_delay: float = 1.0, max_steps: int = 10000):
+        self.max_delay = max_delay
+        self.max_steps = max_steps
+        self.dropped = 0
+        self._pending: Dict[float, Dict[int, Message]] = {}
+        self._heap: List[float] = []
+        self._newest = float("-inf")
+        self._emitted = float("-inf")
+
+    def push(self, msg: Message) -> List[Dict[int, Message]]:
+        """Add ``msg`` and return the steps that became final, in order."""
+        ts = msg.timestamp
+        if ts <= self._emitted:
+            self.dropped += 1
+            return []
+        step = self._pending.get(ts)
+        if step is None:
+            step = self._pending[ts] = {}
+            heapq.heappush(self._heap, ts)
+        step[msg.pgn] = msg
+        if ts > self._newest:
+            self._newest = ts
+        return self._release(self._newest - self.max_delay)
+
+    def flush(self) -> List[Dict[int, Message]]:
+        """Emit every pending step, e.g. at the end of the stream."""
+        return self._release(float("inf"))
+
+    def _release(self, watermark: float) -> List[Dict[int, Message]]:
+        ready: List[Dict[int, Message]] = []
+        heap = self._heap
+        while heap and (heap[0] < watermark or len(heap) > self.max_steps):
+            ts = heapq.heappop(heap)
+            ready.append(self._pending.pop(ts))
+            self._emitted = ts
+        return ready
+
+    def group(self, messages: Iterable[Message]) -> Iterator[Dict[int, Message]]:
+        """Lazily group ``messages``, flushing pending steps at the end."""
+        for msg in messages:
+            yield from self.push(msg)
+        yield from self.flush()
+
+
+def group_by_timestamp(messages: Iterable[Message]) -> List[Dict[int, Message]]:
+    """Group messages that share a timestamp.
+
+    ``messages`` may also be a :class:`MessageBatch`.  Returns a list where
+    each element is a mapping from PGN to the corresponding :class:`Message`
+    observed at that timestamp.  The whole input is sorted in memory; use
+    :class:`StreamGrouper` for long or live streams.
+    """
+
+    if isinstance(messages, MessageBatch):
+        return list(messages.iter_steps())
+    return list(iter_steps(sorted(messages, key=lambda m: m.timestamp)))
@@ -2,21 +2,27 @@ from __future__ import annotations
 
 """Real-time adapter for the anomaly detector."""
 
-from typing import Iterable
+from typing import Iterable, Iterator
 
-from .detector import AnomalyDetector
-from .parser import Message
+from .detector import Anomaly, AnomalyDetector
+from .parser import Message, StreamGrouper
 
 
-def process_stream(detector: AnomalyDetector, stream: Iterable[Message]):
-    """Process an iterable ``stream`` of messages and yield anomalies."""
+def process_stream(
+    detector: AnomalyDetector,
+    stream: Iterable[Message],
+    max_delay: float = 0.0,
+    grouper: StreamGrouper | None = None,
+) -> Iterator[Anomaly]:
+    """Process an iterable ``stream`` of messages and yield anomalies.
 
-    buffer = []
-    for msg in stream:
-        buffer.append(msg)
-        # Grouping is simplified: we assume messages arrive in timestamp order
-        if len(buffer) > 1000:
-            steps = [{m.pgn: m} for m in buffer]
-            for anomaly in detector.score(steps):
-                yield anomaly
-            buffer.clear()
+    Messages are grouped into steps on the fly and scored as they arrive, so
+    the stream (e.g. from :func:`parser.iter_messages`) is consumed with
+    bounded memory.  Messages up to ``max_delay`` seconds out of order are
+    reordered; later ones are dropped and counted by the ``grouper``, which
+    may be passed in to inspect :attr:`StreamGrouper.dropped` afterwards.
+    """
+
+    if grouper is None:
+        grouper = StreamGrouper(max_delay=max_delay)
+    yield from detector.iter_score(grouper.group(stream))
@@ -8,7 +8,7 @@ import random
 from typing import Dict, List
 
 from .parser import Message
-from . import features
+from . import binlog, features
 
 
 @dataclass
@@ -72,3 +72,12 @@ def write_steps(path: str, steps: List[Step]) -> None:
                 data = ";".join(f"{k}={v}" for k, v in msg.fields.items())
                 ts = datetime.fromtimestamp(msg.timestamp).isoformat()
                 fh.write(f"{ts},{msg.pgn},{data}\n")
+
+
+def write_steps_binary(path: str, steps: List[Step], index_stride: int = 1024) -> None:
+    """Binary counterpart of :func:`write_steps`, see :mod:`binlog`."""
+    binlog.write_messages(
+        path,
+        (msg for step in steps for msg in step.messages.values()),
+        index_stride=index_stride,
+    )
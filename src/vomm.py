@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+"""Variable-order Markov model backed by a compact context trie.
+
+A first-order chain only sees the previous state.  This model predicts each
+state from the longest preceding context (up to ``max_order`` states) that
+occurred often enough in training, in the spirit of a probabilistic suffix
+tree.  Multi-step progressions such as normal -> anomaly -> mitigation ->
+blocking therefore get their own statistics instead of being judged one
+transition at a time.
+
+The trie lives in flat NumPy arrays: child links are sorted
+``parent * S + symbol`` keys and next-state counts are sorted
+``node * S + state`` keys.  Lookups are ``searchsorted`` gathers, so scoring
+a whole sequence costs ``O(max_order)`` vectorised passes.
+"""
+
+from typing import Dict, Hashable, Iterable, List
+
+import numpy as np
+
+
+class VariableOrderMarkov:
+    """Variable-order Markov chain with Laplace smoothing.
+
+    Parameters
+    ----------
+    states:
+        Iterable of all possible states, as for :class:`MarkovChain`.
+    max_order:
+        Longest context, in states, used for prediction.
+    min_count:
+        Contexts seen fewer times than this are pruned; prediction then
+        backs off to the longest retained suffix.
+    max_nodes:
+        Budget for trie nodes, including the root.  When a level does not
+        fit, its most frequent contexts are kept and deeper levels dropped.
+    """
+
+    def __init__(
+        self,
+        states: Iterable[Hashable],
+        max_order: int = 3,
+        min_count: int = 5,
+        max_nodes: int = 100_000,
+    ):
+        if max_order < 1:
+            raise ValueError("max_order must be at least 1")
+        if max_nodes < 1:
+            raise ValueError("max_nodes must be at least 1")
+        self.states: List[Hashable] = list(states)
+        self._index: Dict[Hashable, int] = {s: i for i, s in enumerate(self.states)}
+        self.max_order = max_order
+        self.min_count = min_count
+        self.max_nodes = max_nodes
+        self._reset()
+
+    def _reset(self) -> None:
+        # Node 0 is the root, i.e. the empty context
+        self.parent = np.array([-1], dtype=np.int64)
+        self.symbol = np.array([-1], dtype=np.int64)
+        self.depth = np.array([0], dtype=np.int64)
+        self._child_keys = np.empty(0, dtype=np.int64)
+        self._child_ids = np.empty(0, dtype=np.int64)
+        self._count_keys = np.empty(0, dtype=np.int64)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._totals = np.zeros(1, dtype=np.int64)
+
+    def __contains__(self, state: Hashable) -> bool:
+        return state in self._index
+
+    @property
+    def n_nodes(self) -> int:
+        """Number of contexts in the trie, including the root."""
+        return len(self.parent)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the trie arrays."""
+        arrays = (
+            self.parent, self.symbol, self.depth, self._child_keys,
+            self._child_ids, self._count_keys, self._counts, self._totals,
+        )
+        return sum(a.nbytes for a in arrays)
+
+    def encode(self, sequence: Iterable[Hashable], strict: bool = True) -> np.ndarray:
+        """Map ``sequence`` to state indices; see :meth:`MarkovChain.encode`."""
+        index = self._index
+        if strict:
+            codes = [index[s] for s in sequence]
+        else:
+            codes = [index.get(s, -1) for s in sequence]
+        return np.asarray(codes, dtype=np.int64)
+
+    def fit(self, sequence: Iterable[Hashable]) -> None:
+        """Build the context trie and next-state counts from ``sequence``.
+
+        Unlike :meth:`MarkovChain.fit` this refits from scratch, since
+        pruning decisions depend on the complete counts.  Unknown states
+        break contexts and are not counted as targets.
+        """
+        self._reset()
+        x = self.encode(sequence, strict=False)
+        n_states = len(self.states)
+        pos = np.arange(1, len(x))
+        targets = x[pos]
+        valid = targets >= 0
+        pos, targets = pos[valid], targets[valid]
+
+        # Every context on a position's path predicts its target
+        pair_keys = [targets]  # root: node 0
+        node = np.zeros(len(pos), dtype=np.int64)
+        alive = np.ones(len(pos), dtype=bool)
+        parents, symbols, depths = [self.parent], [self.symbol], [self.depth]
+        child_keys, child_ids = [], []
+        n_nodes = 1
+        for k in range(1, self.max_order + 1):
+            budget = self.max_nodes - n_nodes
+            if budget <= 0:
+                break
+            cand = np.flatnonzero(alive & (pos >= k))
+            sym = x[pos[cand] - k]
+            cand, sym = cand[sym >= 0], sym[sym >= 0]
+            if not len(cand):
+                break
+            keys, inverse, freq = np.unique(
+                node[cand] * n_states + sym, return_inverse=True, return_counts=True
+            )
+            keep = freq >= self.min_count
+            if keep.sum() > budget:
+                # Keep the most frequent contexts; ties go to the smaller key
+                order = np.argsort(-freq, kind="stable")
+                order = order[keep[order]][:budget]
+                keep = np.zeros(len(keys), dtype=bool)
+                keep[order] = True
+            ids = np.full(len(keys), -1, dtype=np.int64)
+            ids[keep] = n_nodes + np.arange(int(keep.sum()))
+            n_nodes += int(keep.sum())
+
+            kept = keys[keep]
+            parents.append(kept // n_states)
+            symbols.append(kept % n_states)
+            depths.append(np.full(len(kept), k, dtype=np.int64))
+            child_keys.append(kept)
+            child_ids.append(ids[keep])
+
+            new = ids[inverse.reshape(-1)]
+            alive[:] = False
+            alive[cand[new >= 0]] = True
+            node[cand[new >= 0]] = new[new >= 0]
+            pair_keys.append(node[alive] * n_states + targets[alive])
+            if not alive.any():
+                break
+
+        self.parent = np.concatenate(parents)
+        self.symbol = np.concatenate(symbols)
+        self.depth = np.concatenate(depths)
+        if child_keys:
+            # Levels are built in order of parent id, so keys are sorted
+            self._child_keys = np.concatenate(child_keys)
+            self._child_ids = np.concatenate(child_ids)
+        self._count_keys, self._counts = np.unique(
+            np.concatenate(pair_keys), return_counts=True
+        )
+        self._totals = np.bincount(
+            self._count_keys // max(n_states, 1),
+            weights=self._counts,
+            minlength=n_nodes,
+        ).astype(np.int64)
+
+    @staticmethod
+    def _lookup(keys: np.ndarray, values: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """``values`` at ``query`` in sorted ``keys``, or ``-1`` if absent."""
+        if not len(keys):
+            return np.full(len(query), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        return np.where(keys[pos] == query, values[pos], -1)
+
+    def contexts(self, codes: np.ndarray) -> np.ndarray:
+        """Trie node used to predict each of ``codes[1:]``.
+
+        Each node is the longest retained context ending just before the
+        predicted state; its length is ``depth[node]``.
+        """
+        x = np.asarray(codes, dtype=np.int64)
+        n_states = len(self.states)
+        pos = np.arange(1, len(x))
+        node = np.zeros(len(pos), dtype=np.int64)
+        alive = np.ones(len(pos), dtype=bool)
+        for k in range(1, self.max_order + 1):
+            cand = np.flatnonzero(alive & (pos >= k))
+            if not len(cand) or not len(self._child_keys):
+                break
+            child = self._lookup(
+                self._child_keys,
+                self._child_ids,
+                node[cand] * n_states + x[pos[cand] - k],
+            )
+            alive[:] = False
+            alive[cand[child >= 0]] = True
+            node[cand[child >= 0]] = child[child >= 0]
+        return node
+
+    def score_encoded(self, codes: np.ndarray) -> np.ndarray:
+        """Anomaly scores ``-log P(x_t | context)`` for ``t >= 1``."""
+        x = np.asarray(codes, dtype=np.int64)
+        if len(x) and (x.min() < 0 or x.max() >= len(self.states)):
+            raise ValueError("state index out of range")
+        n_states = len(self.states)
+        node = self.contexts(x)
+        counts = self._lookup(self._count_keys, self._counts, node * n_states + x[1:])
+        probs = (np.maximum(counts, 0) + 1.0) / (self._totals[node] + n_states)
+        return -np.log(probs)
+
+    def sequence_loglik(self, sequence: Iterable[Hashable]) -> float:
+        """Log-likelihood of a sequence under the model."""
+        return -float(self.score_encoded(self.encode(sequence)).sum())
+
+    def anomaly_scores(self, sequence: Iterable[Hashable]) -> List[float]:
+        """Negative log-probability for each transition in ``sequence``."""
+        return self.score_encoded(self.encode(sequence)).tolist()